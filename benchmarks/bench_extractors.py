@@ -0,0 +1,52 @@
+"""Benchmark the lxml extractors against the BeautifulSoup fallback on saved fixtures.
+
+    python benchmarks/bench_extractors.py [--rounds 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from ivasms_fixtures import FIXTURES_DIR  # noqa: E402
+
+ENDPOINTS = [
+    ('getsms (ranges)', 'getsms.html', main._range_cards_lxml, main._range_cards_bs4),
+    ('getsms/number', 'getsms_number.html', main._number_cards_lxml, main._number_cards_bs4),
+    ('getsms/number/sms', 'getsms_number_sms.html', main._sms_lxml, main._sms_bs4),
+]
+
+
+def bench(fn, html, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    if not main.HAS_LXML:
+        sys.exit("lxml is not installed — nothing to compare")
+
+    print(f"{'endpoint':<20} {'items':>6} {'bs4 ms':>9} {'lxml ms':>9} {'speedup':>8}")
+    for label, filename, fast, slow in ENDPOINTS:
+        with open(os.path.join(FIXTURES_DIR, filename)) as f:
+            html = f.read()
+        fast_result, slow_result = fast(html), slow(html)
+        if fast_result != slow_result:
+            sys.exit(f"{label}: lxml and BeautifulSoup disagree\n{fast_result!r}\n{slow_result!r}")
+        slow_time = bench(slow, html, args.rounds)
+        fast_time = bench(fast, html, args.rounds)
+        print(f"{label:<20} {len(fast_result):>6} {slow_time * 1000:>9.3f} {fast_time * 1000:>9.3f} {slow_time / fast_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,126 @@
+"""Drive get_received_sms() against the local mock IVASMS server and report per-cycle costs.
+
+    python benchmarks/bench_poller.py --ranges 30 --numbers 50 --messages 5 --latency 0.1 --cycles 10
+
+The mock runs in a subprocess so its CPU and memory stay out of the numbers.
+Reports cycle time, upstream requests per cycle, CPU time and peak memory.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+
+def start_mock(args):
+    cmd = [
+        sys.executable, os.path.join(BENCH_DIR, 'mock_ivasms.py'), '--port', str(args.port),
+        '--ranges', str(args.ranges), '--numbers', str(args.numbers), '--messages', str(args.messages),
+        '--latency', str(args.latency), '--growth', str(args.growth),
+    ]
+    proc = subprocess.Popen(cmd, cwd=BENCH_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{base_url}/__stats", timeout=1)
+            return proc, base_url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("mock IVASMS server did not start")
+
+
+def mock_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def configure_env(base_url, workdir):
+    # Must happen before main is imported: its config is read at import time
+    os.environ.update({
+        'IVASMS_BASE_URL': base_url,
+        'IVASMS_EMAIL': 'bench@example.com',
+        'IVASMS_PASSWORD': 'bench',
+        'LOGIN_MODE': 'sequential',
+        'COORDINATION_BACKEND': 'local',
+        'OTP_HISTORY_DB': os.path.join(workdir, 'otp_history.db'),
+        'DELIVERY_QUEUE_FILE': os.path.join(workdir, 'delivery_queue.json'),
+        'SESSION_FILE': os.path.join(workdir, 'ivasms_session.bin'),
+    })
+
+
+def run(args):
+    proc, base_url = start_mock(args)
+    workdir = tempfile.mkdtemp(prefix='nexusbot-bench-')
+    try:
+        configure_env(base_url, workdir)
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_ROOT)
+        import main
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        account = main.accounts[0]
+        started = time.perf_counter()
+        if not main.ivasms_login(account):
+            sys.exit("login against the mock failed")
+        print(f"login: {time.perf_counter() - started:.2f}s")
+
+        if args.trace_memory:
+            tracemalloc.start()
+
+        print(f"{'cycle':>5} {'seconds':>8} {'requests':>9} {'cpu s':>7} {'otps':>6}")
+        rows = []
+        for cycle in range(args.cycles):
+            before = sum(mock_stats(base_url).values())
+            cpu_before = time.process_time()
+            started = time.perf_counter()
+            messages = main.get_received_sms()
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_before
+            requests_made = sum(mock_stats(base_url).values()) - before
+            # Stand-in for delivery, so later cycles only see new SMS
+            for msg in messages:
+                main.mark_otp_sent(msg['id'], msg['otp'], msg['message'])
+            rows.append((elapsed, requests_made, cpu, len(messages)))
+            print(f"{cycle:>5} {elapsed:>8.3f} {requests_made:>9} {cpu:>7.3f} {len(messages):>6}")
+
+        times = [r[0] for r in rows]
+        print()
+        print(f"cycle time   mean {statistics.mean(times):.3f}s  median {statistics.median(times):.3f}s  max {max(times):.3f}s")
+        print(f"requests     mean {statistics.mean(r[1] for r in rows):.1f} per cycle")
+        print(f"cpu          {sum(r[2] for r in rows):.3f}s total")
+        print(f"peak rss     {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+        if args.trace_memory:
+            print(f"peak python  {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB (tracemalloc)")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ranges', type=int, default=30)
+    parser.add_argument('--numbers', type=int, default=50, help='numbers per range')
+    parser.add_argument('--messages', type=int, default=5, help='SMS per number')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the mock adds to every request')
+    parser.add_argument('--growth', type=int, default=3, help='new SMS per ranges call')
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--trace-memory', action='store_true', help='also report tracemalloc peak (slower)')
+    parser.add_argument('--verbose', action='store_true', help='keep the bot\'s INFO logging')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,84 @@
+"""Micro-benchmark: per-pattern re.search loop vs the compiled ServiceClassifier.
+
+    python benchmarks/bench_service_classifier.py [--size 5000] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+TEMPLATES = [
+    "Your {service} code is {code}. Do not share it.",
+    "{code} is your {service} verification code",
+    "<#> {service}: {code} is your code. Don't share it with anyone.",
+    "Use {code} to sign in to your {service} account",
+    "Your verification code is {code}",
+    "{service} security code: {code}. Expires in 10 minutes.",
+    "G-{code} is your Google verification code.",
+    "Your OTP for login is {code}. Valid for 5 minutes. Ref: {ref}",
+    "Code {code}. Signing in from a new device? Contact support.",
+]
+
+SERVICE_WORDS = [
+    "WhatsApp", "Facebook", "Telegram", "Google", "Twitter", "Instagram", "Apple",
+    "Amazon", "Microsoft", "PayPal", "Netflix", "Uber", "TikTok", "LinkedIn",
+    "Spotify", "Lalamove", "Bolt", "Shopee", "Tinder", "Signal",
+]
+
+
+def build_corpus(size, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        template = rng.choice(TEMPLATES)
+        corpus.append(template.format(
+            service=rng.choice(SERVICE_WORDS),
+            code=rng.randint(1000, 99999999),
+            ref=''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ') for _ in range(6)),
+        ))
+    return corpus
+
+
+def legacy_extract_service(message):
+    for service, pattern in main.SERVICE_PATTERNS.items():
+        if re.search(pattern, message, re.IGNORECASE):
+            return service
+    return "Unknown"
+
+
+def bench(fn, corpus, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in corpus:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size)
+    legacy = bench(legacy_extract_service, corpus, args.rounds)
+    compiled = bench(main.extract_service, corpus, args.rounds)
+    changed = sum(1 for m in corpus if legacy_extract_service(m) != main.extract_service(m))
+
+    print(f"corpus:        {len(corpus)} SMS, best of {args.rounds}")
+    print(f"legacy loop:   {legacy * 1000:8.2f} ms  ({legacy / len(corpus) * 1e6:6.2f} µs/SMS)")
+    print(f"classifier:    {compiled * 1000:8.2f} ms  ({compiled / len(corpus) * 1e6:6.2f} µs/SMS)")
+    print(f"speedup:       {legacy / compiled:8.2f}x")
+    print(f"labels changed by word boundaries: {changed}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,137 @@
+"""HTML shaped like the IVASMS portal responses, for fixtures and the mock server.
+
+    python benchmarks/ivasms_fixtures.py   # regenerate benchmarks/fixtures/*.html
+"""
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+COUNTRIES = [
+    ("BENIN", "229"), ("IVORY COAST", "225"), ("NIGERIA", "234"), ("MADAGASCAR", "261"),
+    ("ALGERIA", "213"), ("INDIA", "91"), ("BRAZIL", "55"), ("UNITED KINGDOM", "44"),
+]
+
+SMS_TEMPLATES = [
+    "Your WhatsApp code is {a}-{b}. Do not share it.",
+    "<#> {a}{b} is your Facebook code. Don't share it.",
+    "Telegram code: {a}{b}. Do not give this code to anyone.",
+    "G-{a}{b} is your Google verification code.",
+    "Your TikTok verification code is {a}{b}",
+    "Use {a}{b} to sign in to your Instagram account",
+]
+
+
+def range_names(count):
+    names = []
+    for i in range(count):
+        country, _ = COUNTRIES[i % len(COUNTRIES)]
+        names.append(f"{country} {1000 + i}")
+    return names
+
+
+def range_numbers(range_name, count):
+    prefix = next((code for country, code in COUNTRIES if range_name.startswith(country)), "229")
+    seed = sum(map(ord, range_name))
+    return [f"{prefix}{(seed * 7919 + j * 104729) % 10**8:08d}" for j in range(count)]
+
+
+def number_messages(number, count):
+    rng = random.Random(number)
+    return [
+        rng.choice(SMS_TEMPLATES).format(a=rng.randint(100, 999), b=rng.randint(100, 999))
+        for _ in range(count)
+    ]
+
+
+def render_ranges(ranges):
+    """ranges: [(range_name, sms_count)]"""
+    cards = []
+    for name, count in ranges:
+        cards.append(f"""
+<div class="card card-body mb-1 pointer" onclick="getDetials('{name}')">
+  <div class="row align-items-center">
+    <div class="col-sm-4"><span class="rname fw-semi-bold">{name}</span></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0">{count}</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0 text-success">{count}</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0 text-warning">0</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0">$ {count * 0.03:.2f}</p></div>
+  </div>
+</div>
+<div class="ContentRange_{name.replace(' ', '_')}" style="display:none"></div>""")
+    return f"""<div class="card mb-3">
+  <div class="card-header"><div class="row"><div class="col-sm-4"><h6>Range</h6></div>
+  <div class="col-3 col-sm-2 text-center"><h6>Count</h6></div><div class="col-3 col-sm-2 text-center"><h6>Paid</h6></div>
+  <div class="col-3 col-sm-2 text-center"><h6>Unpaid</h6></div><div class="col-3 col-sm-2 text-center"><h6>Revenue</h6></div></div></div>
+  <div class="card-body p-0">{''.join(cards)}
+  </div>
+</div>"""
+
+
+def render_numbers(range_name, numbers):
+    """numbers: [(number, sms_count)]"""
+    cards = []
+    for number, count in numbers:
+        cards.append(f"""
+<div class="card card-body border-bottom bg-100 p-2 rounded-0">
+  <div class="row align-items-center">
+    <div class="col-sm-4 border-bottom border-sm-0 pb-2 pb-sm-0 pointer" onclick="getDetialsNumber('{number}','{int(number) % 10**6}')">
+      <span class="nname">{number}</span>
+    </div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0">{count}</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0 text-success">{count}</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0 text-warning">0</p></div>
+    <div class="col-3 col-sm-2 text-center"><p class="mb-0 pb-0">$ {count * 0.03:.2f}</p></div>
+  </div>
+</div>
+<div class="ContentNumber_{number}" style="display:none"></div>""")
+    return f"""<div class="range-numbers" data-range="{range_name}">{''.join(cards)}
+</div>"""
+
+
+def render_sms(messages, sender="Verify"):
+    rows = []
+    for text in messages:
+        rows.append(f"""
+<div class="card card-body border-bottom bg-soft-primary p-2 rounded-0">
+  <div class="row align-items-center">
+    <div class="col-3 col-sm-2"><p class="mb-0 pb-0 fw-semi-bold">{sender}</p></div>
+    <div class="col-9 col-sm-6 text-center text-sm-start"><p class="mb-0 pb-0">{text}</p></div>
+    <div class="col-6 col-sm-2 text-center"><p class="mb-0 pb-0">$ 0.03</p></div>
+    <div class="col-6 col-sm-2 text-center"><p class="mb-0 pb-0 text-muted">00:00:00</p></div>
+  </div>
+</div>""")
+    return f"""<div class="sms-list">{''.join(rows)}
+</div>"""
+
+
+def render_numbers_page(rows):
+    """rows: [(number, range_name)] — the /portal/numbers table."""
+    body = ''.join(
+        f"\n    <tr><td>{number}</td><td>{range_name}</td><td>Active</td><td>$ 0.03</td></tr>"
+        for number, range_name in rows
+    )
+    return f"""<table class="table">
+  <thead><tr><th>Number</th><th>Range</th><th>Status</th><th>Rate</th></tr></thead>
+  <tbody>{body}
+  </tbody>
+</table>"""
+
+
+def write_fixtures(ranges=30, numbers=50, messages=5):
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    names = range_names(ranges)
+    first_numbers = range_numbers(names[0], numbers)
+    pages = {
+        'getsms.html': render_ranges([(name, numbers * messages) for name in names]),
+        'getsms_number.html': render_numbers(names[0], [(n, messages) for n in first_numbers]),
+        'getsms_number_sms.html': render_sms(number_messages(first_numbers[0], messages)),
+    }
+    for filename, html in pages.items():
+        with open(os.path.join(FIXTURES_DIR, filename), 'w') as f:
+            f.write(html)
+        print(f"wrote {filename} ({len(html)} bytes)")
+
+
+if __name__ == '__main__':
+    write_fixtures()
@@ -0,0 +1,179 @@
+"""Local stand-in for the IVASMS portal, for load tests that must not touch the real site.
+
+    python benchmarks/mock_ivasms.py --ranges 30 --numbers 50 --messages 5 --latency 0.2
+
+Point the bot at it with IVASMS_BASE_URL=http://127.0.0.1:8765. Any email and
+password log in. GET /__stats returns request counts per endpoint and
+POST /__stats/reset clears them.
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, make_response, redirect, request
+from werkzeug.serving import make_server
+
+from ivasms_fixtures import (
+    number_messages, range_names, range_numbers, render_numbers, render_numbers_page,
+    render_ranges, render_sms,
+)
+
+COOKIE = 'ivas_sms_session'
+
+
+def page(body, csrf=None):
+    meta = f'<meta name="csrf-token" content="{csrf}">' if csrf else ''
+    return f"<!DOCTYPE html><html><head><title>IVASMS</title>{meta}</head><body>{body}</body></html>"
+
+
+class MockIvasms:
+    """Inventory of ranges × numbers × messages behind the portal endpoints.
+
+    `latency` (seconds, ± `jitter` fraction) is added to every request.
+    `growth` new SMS arrive on random numbers per getsms call, so
+    incremental polling has something to find.
+    """
+
+    def __init__(self, ranges=30, numbers=50, messages=5, latency=0.0, jitter=0.5, growth=0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.growth = growth
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.stats = {}
+        self.inventory = {
+            name: {number: messages for number in range_numbers(name, numbers)}
+            for name in range_names(ranges)
+        }
+        self.app = self._build_app()
+
+    def _count(self, endpoint):
+        with self.lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+
+    def _delay(self):
+        if self.latency > 0:
+            time.sleep(max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter))))
+
+    def _grow(self):
+        with self.lock:
+            for _ in range(self.growth):
+                numbers = self.inventory[self.rng.choice(list(self.inventory))]
+                numbers[self.rng.choice(list(numbers))] += 1
+
+    def _logged_in(self):
+        return request.cookies.get(COOKIE) in self.sessions
+
+    def _build_app(self):
+        app = Flask(__name__)
+
+        @app.before_request
+        def before():
+            if not request.path.startswith('/__stats'):
+                self._count(request.path)
+                self._delay()
+
+        @app.route('/')
+        def home():
+            return page('<h1>IVASMS</h1>')
+
+        @app.route('/login', methods=['GET', 'POST'])
+        def login():
+            if request.method == 'GET':
+                return page('<form method="post"><input type="hidden" name="_token" value="mock-login-token">'
+                            '<input name="email"><input type="password" name="password"></form>')
+            if not request.form.get('email') or not request.form.get('password'):
+                return redirect('/login')
+            session_id = uuid.uuid4().hex
+            self.sessions.add(session_id)
+            resp = make_response(redirect('/portal'))
+            resp.set_cookie(COOKIE, session_id)
+            return resp
+
+        @app.route('/portal')
+        @app.route('/portal/sms/received')
+        def portal():
+            if not self._logged_in():
+                return redirect('/login')
+            return page('<div id="ResultCDR"></div>', csrf='mock-csrf-token')
+
+        @app.route('/portal/numbers')
+        def numbers_page():
+            if not self._logged_in():
+                return redirect('/login')
+            rows = [(number, name) for name, numbers in self.inventory.items() for number in numbers]
+            return page(render_numbers_page(rows), csrf='mock-csrf-token')
+
+        @app.route('/portal/sms/received/getsms', methods=['POST'])
+        def getsms():
+            if not self._logged_in():
+                return redirect('/login')
+            self._grow()
+            with self.lock:
+                ranges = [(name, sum(numbers.values())) for name, numbers in self.inventory.items()]
+            return render_ranges(ranges)
+
+        @app.route('/portal/sms/received/getsms/number', methods=['POST'])
+        def getsms_number():
+            if not self._logged_in():
+                return redirect('/login')
+            range_name = request.form.get('range', '')
+            with self.lock:
+                numbers = list(self.inventory.get(range_name, {}).items())
+            return render_numbers(range_name, numbers)
+
+        @app.route('/portal/sms/received/getsms/number/sms', methods=['POST'])
+        def getsms_number_sms():
+            if not self._logged_in():
+                return redirect('/login')
+            number = request.form.get('Number', '')
+            with self.lock:
+                count = self.inventory.get(request.form.get('Range', ''), {}).get(number, 0)
+            return render_sms(number_messages(number, count))
+
+        @app.route('/__stats')
+        def stats():
+            with self.lock:
+                return jsonify(dict(self.stats))
+
+        @app.route('/__stats/reset', methods=['POST'])
+        def reset_stats():
+            with self.lock:
+                self.stats = {}
+            return jsonify({'status': 'reset'})
+
+        return app
+
+    def serve(self, host='127.0.0.1', port=8765):
+        """Start a threaded server in the background; returns it (call .shutdown() to stop)."""
+        server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ranges', type=int, default=30)
+    parser.add_argument('--numbers', type=int, default=50, help='numbers per range')
+    parser.add_argument('--messages', type=int, default=5, help='SMS per number')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.5, help='latency jitter as a fraction')
+    parser.add_argument('--growth', type=int, default=0, help='new SMS per getsms call')
+    return parser
+
+
+def main_cli():
+    args = build_parser().parse_args()
+    mock = MockIvasms(args.ranges, args.numbers, args.messages, args.latency, args.jitter, args.growth)
+    print(f"mock IVASMS on http://{args.host}:{args.port} — "
+          f"{args.ranges} ranges × {args.numbers} numbers × {args.messages} SMS")
+    make_server(args.host, args.port, mock.app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -1,19 +1,37 @@
 import os
+import atexit
+import contextlib
+import base64
+import hashlib
 import asyncio
+import concurrent.futures
 import logging
 import re
+import shutil
+import socket
 import requests
+import httpx
 import json
+import queue
+import sqlite3
 import time
 import threading
+import functools
+import glob
+import uuid
+from collections import OrderedDict
+from html import escape
+import unicodedata
 import pycountry
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from dotenv import load_dotenv
-from urllib.parse import unquote
+from urllib.parse import unquote, urlparse
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.request import HTTPXRequest
 import random
 
 load_dotenv()
@@ -36,6 +54,46 @@ try:
 except ImportError:
     logger.warning("⚠️ Selenium not available — will use requests only")
 
+# cryptography — optional, needed to keep the IVASMS session on disk between restarts
+HAS_CRYPTO = False
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    HAS_CRYPTO = True
+except ImportError:
+    logger.warning("⚠️ cryptography not available — every start will do a full login")
+
+# redis — optional, only needed for COORDINATION_BACKEND=redis
+HAS_REDIS = False
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    pass
+
+# waitress — production WSGI server; Flask's development server is the fallback
+HAS_WAITRESS = False
+try:
+    from waitress import serve as waitress_serve
+    HAS_WAITRESS = True
+except ImportError:
+    logger.warning("⚠️ waitress not available — HTTP served by Flask's development server")
+
+# prometheus_client — optional, backs the /metrics endpoint
+HAS_PROMETHEUS = False
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    HAS_PROMETHEUS = True
+except ImportError:
+    logger.warning("⚠️ prometheus_client not available — /metrics disabled")
+
+# lxml — optional fast path for the AJAX HTML, BeautifulSoup is the fallback
+HAS_LXML = False
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:
+    logger.warning("⚠️ lxml not available — parsing with BeautifulSoup html.parser")
+
 app = Flask(__name__)
 
 # ============================================================
@@ -49,16 +107,62 @@ IVASMS_PASSWORD = os.getenv('IVASMS_PASSWORD')
 CHANNEL_LINK = os.getenv('CHANNEL_LINK', 'https://t.me/yourchannel')
 DEV_LINK = os.getenv('DEV_LINK', 'https://t.me/yourdev')
 
-LOGIN_URL = "https://www.ivasms.com/login"
-PORTAL_URL = "https://www.ivasms.com/portal/sms/received"
-SMS_LIST_URL = "https://www.ivasms.com/portal/sms/received/getsms"
-SMS_NUMBERS_URL = "https://www.ivasms.com/portal/sms/received/getsms/number"
-SMS_DETAILS_URL = "https://www.ivasms.com/portal/sms/received/getsms/number/sms"
-NUMBERS_PAGE_URL = "https://www.ivasms.com/portal/numbers"
+# Override to point the bot at a local stand-in (benchmarks/mock_ivasms.py)
+IVASMS_BASE_URL = os.getenv('IVASMS_BASE_URL', 'https://www.ivasms.com').rstrip('/')
+IVASMS_HOST = urlparse(IVASMS_BASE_URL).netloc
+
+LOGIN_URL = f"{IVASMS_BASE_URL}/login"
+PORTAL_URL = f"{IVASMS_BASE_URL}/portal/sms/received"
+SMS_LIST_URL = f"{IVASMS_BASE_URL}/portal/sms/received/getsms"
+SMS_NUMBERS_URL = f"{IVASMS_BASE_URL}/portal/sms/received/getsms/number"
+SMS_DETAILS_URL = f"{IVASMS_BASE_URL}/portal/sms/received/getsms/number/sms"
+NUMBERS_PAGE_URL = f"{IVASMS_BASE_URL}/portal/numbers"
+
+# 'auto' uses lxml when installed, 'bs4' forces BeautifulSoup
+HTML_PARSER = os.getenv('HTML_PARSER', 'auto').lower()
+
+# Async crawl — max in-flight requests per stage (ranges is shared by all accounts, the rest are per account)
+CRAWL_RANGES_CONCURRENCY = int(os.getenv('CRAWL_RANGES_CONCURRENCY', '4'))
+CRAWL_NUMBERS_CONCURRENCY = int(os.getenv('CRAWL_NUMBERS_CONCURRENCY', '5'))
+CRAWL_SMS_CONCURRENCY = int(os.getenv('CRAWL_SMS_CONCURRENCY', '10'))
+# Incremental polling — re-crawl everything every N cycles regardless of counts
+CRAWL_FULL_RESYNC_CYCLES = max(1, int(os.getenv('CRAWL_FULL_RESYNC_CYCLES', '30')))
+
+# Adaptive polling — seconds between full sweeps (hot numbers are polled separately, below)
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '15'))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '60'))
+POLL_BACKOFF_CEILING = float(os.getenv('POLL_BACKOFF_CEILING', '300'))
+POLL_DURATION_FACTOR = float(os.getenv('POLL_DURATION_FACTOR', '1'))
+POLL_RATE_ALPHA = float(os.getenv('POLL_RATE_ALPHA', '0.3'))
+POLL_JITTER = float(os.getenv('POLL_JITTER', '0.1'))
+
+# Hot set — numbers assigned to users or with recent SMS, polled directly every few seconds
+HOT_POLL_INTERVAL = float(os.getenv('HOT_POLL_INTERVAL', '3'))
+HOT_POLL_CONCURRENCY = int(os.getenv('HOT_POLL_CONCURRENCY', '5'))
+HOT_SET_MAX = int(os.getenv('HOT_SET_MAX', '50'))
+HOT_ASSIGNMENT_IDLE_SECONDS = float(os.getenv('HOT_ASSIGNMENT_IDLE_SECONDS', '900'))
+HOT_RECENT_SMS_SECONDS = float(os.getenv('HOT_RECENT_SMS_SECONDS', '300'))
+
+# Per-user delivery — OTPs on an assigned number go to that user's private chat.
+# OTP_GROUP_BROADCAST: 'always' (group too), 'unassigned' (group only when nobody holds the number), 'never'
+OTP_GROUP_BROADCAST = os.getenv('OTP_GROUP_BROADCAST', 'always').lower()
+SUBSCRIPTION_IDLE_SECONDS = float(os.getenv('SUBSCRIPTION_IDLE_SECONDS', '86400'))
+
+# /portal/numbers cache — served from memory, refreshed in the background once stale
+NUMBERS_CACHE_TTL = float(os.getenv('NUMBERS_CACHE_TTL', '300'))
+NUMBERS_CACHE_RETRY_SECONDS = float(os.getenv('NUMBERS_CACHE_RETRY_SECONDS', '30'))
+# Number allocation — each user gets an exclusive lease on a number, renewed while they use the bot
+NUMBER_LEASE_SECONDS = float(os.getenv('NUMBER_LEASE_SECONDS', '1800'))
+
+# Per-user bot state — bounded LRU with idle expiry, checkpointed so assignments survive restarts
+USER_SESSIONS_FILE = os.getenv('USER_SESSIONS_FILE', 'user_sessions.json')
+USER_SESSIONS_MAX = int(os.getenv('USER_SESSIONS_MAX', '50000'))
+USER_SESSION_TTL = float(os.getenv('USER_SESSION_TTL', '604800'))
+USER_SESSIONS_CHECKPOINT_SECONDS = float(os.getenv('USER_SESSIONS_CHECKPOINT_SECONDS', '30'))
 
 # From script 2 — full realistic browser headers
 BASE_HEADERS = {
-    "Host": "www.ivasms.com",
+    "Host": IVASMS_HOST,
     "Cache-Control": "max-age=0",
     "Sec-Ch-Ua": '"Not)A;Brand";v="8", "Chromium";v="138"',
     "Sec-Ch-Ua-Mobile": "?0",
@@ -76,6 +180,9 @@ BASE_HEADERS = {
     "Connection": "keep-alive"
 }
 
+# Checked in order — the first service whose pattern appears wins.
+# Set SERVICE_PATTERNS_FILE to a JSON file with the same shape to override.
+SERVICE_PATTERNS_FILE = os.getenv('SERVICE_PATTERNS_FILE')
 SERVICE_PATTERNS = {
     "WhatsApp": r"(whatsapp|wa\.me|verify|wassap|whtsapp)",
     "Facebook": r"(facebook|fb\.me|fb\-|meta)",
@@ -110,7 +217,87 @@ COUNTRY_ALIASES = {
     "Madagascar": "Madagascar",
 }
 
+# ITU calling code -> alpha-2 (main region for shared codes like +1 and +7)
+DIALING_CODES = {
+    '1': 'US', '7': 'RU', '20': 'EG', '27': 'ZA', '30': 'GR', '31': 'NL', '32': 'BE', '33': 'FR',
+    '34': 'ES', '36': 'HU', '39': 'IT', '40': 'RO', '41': 'CH', '43': 'AT', '44': 'GB', '45': 'DK',
+    '46': 'SE', '47': 'NO', '48': 'PL', '49': 'DE', '51': 'PE', '52': 'MX', '53': 'CU', '54': 'AR',
+    '55': 'BR', '56': 'CL', '57': 'CO', '58': 'VE', '60': 'MY', '61': 'AU', '62': 'ID', '63': 'PH',
+    '64': 'NZ', '65': 'SG', '66': 'TH', '81': 'JP', '82': 'KR', '84': 'VN', '86': 'CN', '90': 'TR',
+    '91': 'IN', '92': 'PK', '93': 'AF', '94': 'LK', '95': 'MM', '98': 'IR', '211': 'SS',
+    '212': 'MA', '213': 'DZ', '216': 'TN', '218': 'LY', '220': 'GM', '221': 'SN', '222': 'MR',
+    '223': 'ML', '224': 'GN', '225': 'CI', '226': 'BF', '227': 'NE', '228': 'TG', '229': 'BJ',
+    '230': 'MU', '231': 'LR', '232': 'SL', '233': 'GH', '234': 'NG', '235': 'TD', '236': 'CF',
+    '237': 'CM', '238': 'CV', '239': 'ST', '240': 'GQ', '241': 'GA', '242': 'CG', '243': 'CD',
+    '244': 'AO', '245': 'GW', '246': 'IO', '247': 'AC', '248': 'SC', '249': 'SD', '250': 'RW',
+    '251': 'ET', '252': 'SO', '253': 'DJ', '254': 'KE', '255': 'TZ', '256': 'UG', '257': 'BI',
+    '258': 'MZ', '260': 'ZM', '261': 'MG', '262': 'RE', '263': 'ZW', '264': 'NA', '265': 'MW',
+    '266': 'LS', '267': 'BW', '268': 'SZ', '269': 'KM', '290': 'SH', '291': 'ER', '297': 'AW',
+    '298': 'FO', '299': 'GL', '350': 'GI', '351': 'PT', '352': 'LU', '353': 'IE', '354': 'IS',
+    '355': 'AL', '356': 'MT', '357': 'CY', '358': 'FI', '359': 'BG', '370': 'LT', '371': 'LV',
+    '372': 'EE', '373': 'MD', '374': 'AM', '375': 'BY', '376': 'AD', '377': 'MC', '378': 'SM',
+    '380': 'UA', '381': 'RS', '382': 'ME', '383': 'XK', '385': 'HR', '386': 'SI', '387': 'BA',
+    '389': 'MK', '420': 'CZ', '421': 'SK', '423': 'LI', '500': 'FK', '501': 'BZ', '502': 'GT',
+    '503': 'SV', '504': 'HN', '505': 'NI', '506': 'CR', '507': 'PA', '508': 'PM', '509': 'HT',
+    '590': 'GP', '591': 'BO', '592': 'GY', '593': 'EC', '594': 'GF', '595': 'PY', '596': 'MQ',
+    '597': 'SR', '598': 'UY', '599': 'CW', '670': 'TL', '672': 'NF', '673': 'BN', '674': 'NR',
+    '675': 'PG', '676': 'TO', '677': 'SB', '678': 'VU', '679': 'FJ', '680': 'PW', '681': 'WF',
+    '682': 'CK', '683': 'NU', '685': 'WS', '686': 'KI', '687': 'NC', '688': 'TV', '689': 'PF',
+    '690': 'TK', '691': 'FM', '692': 'MH', '850': 'KP', '852': 'HK', '853': 'MO', '855': 'KH',
+    '856': 'LA', '880': 'BD', '886': 'TW', '960': 'MV', '961': 'LB', '962': 'JO', '963': 'SY',
+    '964': 'IQ', '965': 'KW', '966': 'SA', '967': 'YE', '968': 'OM', '970': 'PS', '971': 'AE',
+    '972': 'IL', '973': 'BH', '974': 'QA', '975': 'BT', '976': 'MN', '977': 'NP', '992': 'TJ',
+    '993': 'TM', '994': 'AZ', '995': 'GE', '996': 'KG', '998': 'UZ',
+}
+
+# 'race' runs the requests and browser logins in parallel, 'sequential' tries them in turn.
+# Either way the strategy that succeeded last goes first.
+LOGIN_MODE = os.getenv('LOGIN_MODE', 'race').lower()
+LOGIN_RACE_HEAD_START = float(os.getenv('LOGIN_RACE_HEAD_START', '8'))
+
+# Warm Chrome for the Selenium fallback — persistent profile plus recycle limits
+BROWSER_PROFILE_DIR = os.getenv('BROWSER_PROFILE_DIR', 'chrome_profile')
+BROWSER_KEEP_WARM = os.getenv('BROWSER_KEEP_WARM', '1') == '1'
+BROWSER_MAX_LOGINS = int(os.getenv('BROWSER_MAX_LOGINS', '20'))
+BROWSER_MAX_AGE = float(os.getenv('BROWSER_MAX_AGE', '21600'))
+BROWSER_MAX_RSS_MB = float(os.getenv('BROWSER_MAX_RSS_MB', '700'))
+
+# Optional portal probe interval (0 = off); expiry is otherwise detected on each response
+SESSION_KEEPALIVE_SECONDS = float(os.getenv('SESSION_KEEPALIVE_SECONDS', '0'))
+
+# Encrypted session cookies; key derived from SESSION_SECRET (or the bot/IVASMS credentials)
+SESSION_FILE = os.getenv('SESSION_FILE', 'ivasms_session.bin')
+SESSION_SECRET = os.getenv('SESSION_SECRET')
+
 OTP_HISTORY_FILE = "otp_history.json"
+DELIVERY_QUEUE_FILE = os.getenv('DELIVERY_QUEUE_FILE', 'delivery_queue.json')
+
+# Telegram send limits used by the delivery queue
+TELEGRAM_GLOBAL_PER_SECOND = float(os.getenv('TELEGRAM_GLOBAL_PER_SECOND', '30'))
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv('TELEGRAM_GROUP_PER_MINUTE', '20'))
+TELEGRAM_PRIVATE_PER_SECOND = float(os.getenv('TELEGRAM_PRIVATE_PER_SECOND', '1'))
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', '4'))
+DELIVERY_MAX_BACKOFF = float(os.getenv('DELIVERY_MAX_BACKOFF', '60'))
+OTP_HISTORY_FLUSH_SECONDS = float(os.getenv('OTP_HISTORY_FLUSH_SECONDS', '5'))
+# 'sqlite' (default) or 'json'
+OTP_HISTORY_BACKEND = os.getenv('OTP_HISTORY_BACKEND', 'sqlite').lower()
+OTP_HISTORY_DB = os.getenv('OTP_HISTORY_DB', 'otp_history.db')
+OTP_HISTORY_BATCH_SIZE = int(os.getenv('OTP_HISTORY_BATCH_SIZE', '50'))
+OTP_HISTORY_RETENTION_DAYS = float(os.getenv('OTP_HISTORY_RETENTION_DAYS', '30'))
+OTP_HISTORY_VACUUM_SECONDS = float(os.getenv('OTP_HISTORY_VACUUM_SECONDS', '21600'))
+
+# Multi-process coordination: one poller holds a lease, every OTP is claimed before it is sent.
+# 'sqlite' shares a file between processes on one host, 'redis' works across hosts/dynos,
+# 'local' is the in-process stand-in for a single process and tests.
+COORDINATION_BACKEND = os.getenv('COORDINATION_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'sqlite').lower()
+COORDINATION_DB = os.getenv('COORDINATION_DB', 'coordination.db')
+REDIS_URL = os.getenv('REDIS_URL')
+LEADER_LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS', '30'))
+OTP_CLAIM_TTL_SECONDS = float(os.getenv('OTP_CLAIM_TTL_SECONDS', '604800'))
+
+# HTTP API — worker threads for the WSGI server, finished jobs kept for /jobs/<id>
+HTTP_THREADS = int(os.getenv('HTTP_THREADS', '8'))
+JOB_HISTORY_SIZE = int(os.getenv('JOB_HISTORY_SIZE', '100'))
 
 bot_stats = {
     'start_time': datetime.now(),
@@ -122,12 +309,132 @@ bot_stats = {
     'consecutive_failures': 0,
 }
 
-user_sessions = {}
 bot = None
 telegram_app = None
-ivasms_session = None
-last_login_time = 0
-csrf_token = None
+
+# ============================================================
+# METRICS — Prometheus histograms and gauges for /metrics
+# ============================================================
+
+class _NoopMetric:
+    """Stand-in when prometheus_client is missing, so instrumentation stays unconditional."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, fn):
+        pass
+
+    @contextlib.contextmanager
+    def time(self):
+        yield
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+def _histogram(name, doc, labels=(), buckets=LATENCY_BUCKETS):
+    return Histogram(name, doc, labels, buckets=buckets) if HAS_PROMETHEUS else _NoopMetric()
+
+def _gauge(name, doc, labels=()):
+    return Gauge(name, doc, labels) if HAS_PROMETHEUS else _NoopMetric()
+
+def _counter(name, doc, labels=()):
+    return Counter(name, doc, labels) if HAS_PROMETHEUS else _NoopMetric()
+
+POLL_CYCLE_SECONDS = _histogram('nexusbot_poll_cycle_seconds', 'Duration of one crawl-and-enqueue cycle')
+UPSTREAM_SECONDS = _histogram('nexusbot_upstream_request_seconds', 'IVASMS request latency', ['endpoint'])
+LOGIN_SECONDS = _histogram('nexusbot_login_seconds', 'IVASMS login duration', ['strategy', 'outcome'])
+PARSE_SECONDS = _histogram('nexusbot_parse_seconds', 'HTML extraction time', ['kind'], buckets=PARSE_BUCKETS)
+TIME_TO_FIRST_OTP_SECONDS = _histogram('nexusbot_time_to_first_otp_seconds', 'Cycle start to the first new OTP, for cycles that find one')
+DISCOVERY_TO_DELIVERY_SECONDS = _histogram('nexusbot_discovery_to_delivery_seconds', 'OTP parsed to Telegram send completed', ['chat_type'])
+TELEGRAM_SEND_SECONDS = _histogram('nexusbot_telegram_send_seconds', 'Telegram send_message latency', ['chat_type'])
+DELIVERY_QUEUE_DEPTH = _gauge('nexusbot_delivery_queue_depth', 'OTPs waiting for delivery')
+CYCLE_RANGES = _gauge('nexusbot_cycle_ranges', 'Ranges listed in the last cycle', ['account'])
+CYCLE_NUMBERS = _gauge('nexusbot_cycle_numbers', 'Numbers listed in the last cycle', ['account'])
+HOT_SET_SIZE = _gauge('nexusbot_hot_set_numbers', 'Numbers in the hot set', ['reason'])
+HOT_POLL_SECONDS = _histogram('nexusbot_hot_poll_seconds', 'Duration of one hot-set polling pass')
+NUMBERS_FREE = _gauge('nexusbot_numbers_free', 'Numbers not leased to any user')
+NUMBERS_LEASED = _gauge('nexusbot_numbers_leased', 'Numbers leased to users')
+DEDUP_INDEX_SIZE = _gauge('nexusbot_dedup_index_entries', 'Entries in the sent-OTP history')
+OTPS_SENT = _counter('nexusbot_otps_sent_total', 'OTPs delivered to every target chat')
+
+def _endpoint_name(url):
+    return {
+        SMS_LIST_URL: 'ranges',
+        SMS_NUMBERS_URL: 'numbers',
+        SMS_DETAILS_URL: 'sms',
+        NUMBERS_PAGE_URL: 'numbers_page',
+        PORTAL_URL: 'portal',
+    }.get(url, 'other')
+
+# ============================================================
+# ACCOUNTS
+# ============================================================
+
+class IvasmsAccount:
+    """One IVASMS login: credentials, live session and crawl state."""
+
+    def __init__(self, name, email, password, session_file):
+        self.name = name
+        self.email = email
+        self.password = password
+        self.session_file = session_file
+        self.session = None
+        self.csrf_token = None
+        self.last_login_time = 0
+        # Bumped on every successful login so concurrent expiry handlers renew only once
+        self.generation = 0
+        self.renew_lock = threading.Lock()
+        self.last_keepalive = 0
+        self.session_valid = False
+        self.strategy_stats = {
+            strategy: {'last_success': 0, 'last_failure': 0, 'last_duration': None}
+            for strategy in ('requests', 'browser')
+        }
+        # Last seen SMS count per range / per number, for incremental polling
+        self.snapshot = {'ok': False, 'cycle': 0, 'ranges': {}, 'numbers': {}}
+
+
+def load_accounts():
+    """IVASMS_ACCOUNTS (JSON list of {name, email, password}), else IVASMS_EMAIL/_PASSWORD plus _2, _3, ..."""
+    creds = []
+    raw = os.getenv('IVASMS_ACCOUNTS')
+    if raw:
+        try:
+            for i, entry in enumerate(json.loads(raw)):
+                creds.append((entry.get('name') or f"acc{i + 1}", entry['email'], entry['password']))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Invalid IVASMS_ACCOUNTS: {e}")
+    else:
+        if IVASMS_EMAIL and IVASMS_PASSWORD:
+            creds.append(("acc1", IVASMS_EMAIL, IVASMS_PASSWORD))
+        n = 2
+        while os.getenv(f'IVASMS_EMAIL_{n}'):
+            creds.append((f"acc{n}", os.getenv(f'IVASMS_EMAIL_{n}'), os.getenv(f'IVASMS_PASSWORD_{n}', '')))
+            n += 1
+
+    # The first account keeps SESSION_FILE so existing saved sessions still load
+    root, ext = os.path.splitext(SESSION_FILE)
+    return [
+        IvasmsAccount(name, email, password, SESSION_FILE if i == 0 else f"{root}.{name}{ext}")
+        for i, (name, email, password) in enumerate(creds)
+    ]
+
+accounts = load_accounts()
+# number -> IvasmsAccount that owns it, filled from the numbers page and the crawl
+number_accounts = {}
+
+def _update_session_stats():
+    bot_stats['session_valid'] = bool(accounts) and all(a.session_valid for a in accounts)
 
 # ============================================================
 # HELPERS
@@ -139,15 +446,63 @@ def get_flag_emoji(country_code):
     code_points = [ord(c.upper()) - ord('A') + 0x1F1E6 for c in country_code]
     return chr(code_points[0]) + chr(code_points[1])
 
-def get_country_emoji(country_name):
+def _normalize_country_name(name):
+    name = unicodedata.normalize('NFKD', name or '')
+    return ''.join(c for c in name.lower() if 'a' <= c <= 'z')
+
+def _build_country_table():
+    table = {}
+    for country in pycountry.countries:
+        for attr in ('name', 'official_name', 'common_name', 'alpha_3'):
+            value = getattr(country, attr, None)
+            if value:
+                table.setdefault(_normalize_country_name(value), country.alpha_2)
+    for alias, name in COUNTRY_ALIASES.items():
+        code = table.get(_normalize_country_name(name))
+        if code:
+            table[_normalize_country_name(alias)] = code
+    return table
+
+# Normalized country name / alias / alpha-3 -> alpha-2, built once at import
+COUNTRY_TABLE = _build_country_table()
+
+@functools.lru_cache(maxsize=512)
+def _fuzzy_country_code(name):
     try:
-        name = COUNTRY_ALIASES.get(country_name, country_name)
         countries = pycountry.countries.search_fuzzy(name)
         if countries:
-            return get_flag_emoji(countries[0].alpha_2)
+            return countries[0].alpha_2
     except Exception:
         pass
-    return "🌍"
+    return None
+
+def country_code_for_number(number):
+    digits = re.sub(r'\D', '', number or '')
+    for length in range(4, 0, -1):
+        code = DIALING_CODES.get(digits[:length])
+        if code:
+            return code
+    return None
+
+def get_country_emoji(country_name, number=None):
+    code = country_code_for_number(number) if number else None
+    if not code and country_name:
+        name = COUNTRY_ALIASES.get(country_name, country_name)
+        code = COUNTRY_TABLE.get(_normalize_country_name(name)) or _fuzzy_country_code(name)
+    return get_flag_emoji(code)
+
+def get_range_emoji(range_name, number=None):
+    """Flag for a range: phone dialing prefix first, then the longest known leading words."""
+    code = country_code_for_number(number) if number else None
+    if not code:
+        words = [_normalize_country_name(w) for w in (range_name or '').split()]
+        for n in range(min(len(words), 4), 0, -1):
+            code = COUNTRY_TABLE.get(''.join(words[:n]))
+            if code:
+                break
+    if code:
+        return get_flag_emoji(code)
+    return get_country_emoji(extract_country_from_range(range_name))
 
 def extract_country_from_range(range_name):
     if not range_name:
@@ -157,16 +512,74 @@ def extract_country_from_range(range_name):
         return parts[0].capitalize()
     return "Unknown"
 
+class ServiceClassifier:
+    """All service patterns compiled into one alternation with a named group each.
+
+    Patterns are tried in priority order (lower number wins) and wrapped in
+    word boundaries unless word_boundary is False, so 'ig' no longer matches
+    inside 'sign'. One finditer pass per message, no per-pattern searches.
+    """
+
+    def __init__(self, patterns):
+        rules = []
+        for order, (service, spec) in enumerate(patterns.items()):
+            if isinstance(spec, str):
+                spec = {"pattern": spec}
+            rules.append((spec.get("priority", order), service, spec["pattern"], spec.get("word_boundary", True)))
+        rules.sort(key=lambda rule: rule[0])
+
+        self.services = [service for _, service, _, _ in rules]
+        bounded = [f"(?P<s{i}>{pattern})" for i, (_, _, pattern, wb) in enumerate(rules) if wb]
+        unbounded = [f"(?P<s{i}>{pattern})" for i, (_, _, pattern, wb) in enumerate(rules) if not wb]
+        # Factor the \b out of the bounded group so mid-word positions fail on one check
+        parts = []
+        if bounded:
+            parts.append(rf"\b(?:{'|'.join(bounded)})\b")
+        parts.extend(unbounded)
+        self.regex = re.compile("|".join(parts), re.IGNORECASE)
+
+    def classify(self, message):
+        best = None
+        for match in self.regex.finditer(message):
+            rank = int(match.lastgroup[1:])
+            if rank == 0:
+                return self.services[0]
+            if best is None or rank < best:
+                best = rank
+        return self.services[best] if best is not None else "Unknown"
+
+
+def load_service_patterns(path=None):
+    """SERVICE_PATTERNS, or the JSON object in `path` (service -> pattern or rule dict)."""
+    path = path or SERVICE_PATTERNS_FILE
+    if path:
+        try:
+            with open(path, 'r') as f:
+                patterns = json.load(f)
+            logger.info(f"✅ Loaded {len(patterns)} service patterns from {path}")
+            return patterns
+        except Exception as e:
+            logger.error(f"Error loading service patterns from {path}: {e} — using built-in patterns")
+    return SERVICE_PATTERNS
+
+service_classifier = ServiceClassifier(load_service_patterns())
+
 def extract_service(message):
-    for service, pattern in SERVICE_PATTERNS.items():
-        if re.search(pattern, message, re.IGNORECASE):
-            return service
-    return "Unknown"
+    return service_classifier.classify(message)
 
 def extract_otp(text):
     match = re.search(r'\b(\d{4,8})\b', text)
     return match.group(1) if match else None
 
+def atomic_write(path, data, mode=None):
+    """Write `data` (str or bytes) to a temp file and swap it in, so a crash can't leave half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+    if mode is not None:
+        os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
 # ============================================================
 # OTP HISTORY
 # ============================================================
@@ -182,54 +595,482 @@ def load_otp_history():
 
 def save_otp_history(history):
     try:
-        with open(OTP_HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+        atomic_write(OTP_HISTORY_FILE, json.dumps(history, separators=(',', ':')))
     except Exception as e:
         logger.error(f"Error saving OTP history: {e}")
 
+
+class OtpHistoryIndex:
+    """OTP history kept in memory with an O(1) (msg_id, message) index.
+
+    Loaded from OTP_HISTORY_FILE once; changes are written back by a
+    background thread every OTP_HISTORY_FLUSH_SECONDS and on exit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history = load_otp_history()
+        self.index = {
+            (msg_id, entry.get("full_message"))
+            for msg_id, entries in self.history.items()
+            for entry in entries
+        }
+        self.dirty = False
+        logger.info(f"📚 Loaded OTP history: {len(self.index)} entries")
+
+    def __len__(self):
+        return len(self.index)
+
+    def contains(self, msg_id, full_message):
+        return (msg_id, full_message) in self.index
+
+    def add(self, msg_id, otp, full_message):
+        with self.lock:
+            self.history.setdefault(msg_id, []).append({
+                "otp": otp,
+                "full_message": full_message,
+                "timestamp": datetime.now().isoformat()
+            })
+            self.index.add((msg_id, full_message))
+            self.dirty = True
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {msg_id: list(entries) for msg_id, entries in self.history.items()}
+            self.dirty = False
+        save_otp_history(snapshot)
+
+    def maintain(self):
+        # The JSON file is never pruned; use the sqlite backend for retention
+        pass
+
+    def start(self):
+        _start_history_flusher(self)
+
+
+class SqliteOtpHistory:
+    """OTP history persisted in a SQLite file (WAL mode), pruned to OTP_HISTORY_RETENTION_DAYS.
+
+    Lookups never touch the database: the (msg_id, message) keys inside
+    the retention window stay resident, loaded once at open, so contains()
+    is O(1) like OtpHistoryIndex. New entries are buffered and inserted in
+    batches. An existing otp_history.json is imported once on first open.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()      # index and pending buffer
+        self.db_lock = threading.Lock()   # the connection; held through inserts and VACUUM
+        self.pending = []
+        self.last_maintenance = time.time()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS otp_history (
+                msg_id TEXT NOT NULL,
+                otp TEXT,
+                full_message TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_otp_history_msg_id ON otp_history (msg_id);
+            CREATE INDEX IF NOT EXISTS idx_otp_history_timestamp ON otp_history (timestamp);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.conn.commit()
+        self._import_json_once()
+        # (msg_id, full_message) -> timestamp, oldest first so pruning pops from the front
+        self.index = {
+            (msg_id, full_message): timestamp
+            for msg_id, full_message, timestamp in self.conn.execute(
+                "SELECT msg_id, full_message, timestamp FROM otp_history WHERE timestamp >= ? ORDER BY timestamp",
+                (self._cutoff(),)
+            )
+        }
+        logger.info(f"📚 Opened OTP history database: {len(self)} entries")
+
+    @staticmethod
+    def _cutoff():
+        if OTP_HISTORY_RETENTION_DAYS <= 0:
+            return ''
+        return (datetime.now() - timedelta(days=OTP_HISTORY_RETENTION_DAYS)).isoformat()
+
+    def _import_json_once(self):
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        history = load_otp_history()
+        rows = [
+            (msg_id, entry.get("otp"), entry.get("full_message") or "", entry.get("timestamp") or datetime.now().isoformat())
+            for msg_id, entries in history.items()
+            for entry in entries
+        ]
+        with self.conn:
+            self.conn.executemany("INSERT INTO otp_history VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT INTO meta VALUES ('json_imported', ?)", (datetime.now().isoformat(),))
+        if rows:
+            logger.info(f"📥 Imported {len(rows)} entries from {OTP_HISTORY_FILE}")
+
+    def __len__(self):
+        return len(self.index)
+
+    def contains(self, msg_id, full_message):
+        return (msg_id, full_message) in self.index
+
+    def add(self, msg_id, otp, full_message):
+        timestamp = datetime.now().isoformat()
+        with self.lock:
+            self.pending.append((msg_id, otp, full_message, timestamp))
+            self.index.pop((msg_id, full_message), None)
+            self.index[(msg_id, full_message)] = timestamp
+            batch_full = len(self.pending) >= OTP_HISTORY_BATCH_SIZE
+        if batch_full:
+            self.flush()
+
+    def flush(self):
+        with self.db_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                with self.conn:
+                    self.conn.executemany("INSERT INTO otp_history VALUES (?, ?, ?, ?)", batch)
+            except Exception as e:
+                logger.error(f"Error saving OTP history: {e}")
+                with self.lock:
+                    self.pending = batch + self.pending
+
+    def maintain(self):
+        if time.time() - self.last_maintenance < OTP_HISTORY_VACUUM_SECONDS:
+            return
+        self.last_maintenance = time.time()
+        if OTP_HISTORY_RETENTION_DAYS <= 0:
+            return
+        cutoff = self._cutoff()
+        with self.lock:
+            while self.index:
+                key, timestamp = next(iter(self.index.items()))
+                if timestamp >= cutoff:
+                    break
+                del self.index[key]
+        with self.db_lock:
+            try:
+                with self.conn:
+                    deleted = self.conn.execute("DELETE FROM otp_history WHERE timestamp < ?", (cutoff,)).rowcount
+                if deleted:
+                    self.conn.execute("VACUUM")
+                    self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    logger.info(f"🧹 Pruned {deleted} OTP history entries older than {OTP_HISTORY_RETENTION_DAYS} days")
+            except Exception as e:
+                logger.error(f"Error compacting OTP history: {e}")
+
+    def start(self):
+        _start_history_flusher(self)
+
+
+def _start_history_flusher(store):
+    def run_flusher():
+        while True:
+            time.sleep(OTP_HISTORY_FLUSH_SECONDS)
+            store.flush()
+            store.maintain()
+    threading.Thread(target=run_flusher, daemon=True).start()
+    atexit.register(store.flush)
+
+
+otp_history = None
+
+def get_otp_history():
+    global otp_history
+    if otp_history is None:
+        if OTP_HISTORY_BACKEND == 'sqlite':
+            otp_history = SqliteOtpHistory(OTP_HISTORY_DB)
+        else:
+            otp_history = OtpHistoryIndex()
+        otp_history.start()
+    return otp_history
+
 def is_otp_already_sent(msg_id, full_message):
-    history = load_otp_history()
-    if msg_id not in history:
-        return False
-    for entry in history[msg_id]:
-        if entry.get("full_message") == full_message:
-            return True
-    return False
+    # Still waiting in the delivery queue counts too, or every poll would find it again
+    return delivery_queue.pending(msg_id, full_message) or get_otp_history().contains(msg_id, full_message)
 
 def mark_otp_sent(msg_id, otp, full_message):
-    history = load_otp_history()
-    if msg_id not in history:
-        history[msg_id] = []
-    history[msg_id].append({
-        "otp": otp,
-        "full_message": full_message,
-        "timestamp": datetime.now().isoformat()
-    })
-    save_otp_history(history)
+    get_otp_history().add(msg_id, otp, full_message)
+
+# ============================================================
+# COORDINATION — poller lease and claim-before-send across processes
+# ============================================================
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class LocalCoordinator:
+    """In-process stand-in with the same semantics as the shared backends."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.claims = {}
+
+    def acquire_lease(self, name, owner, ttl):
+        """Take or extend `name` for `owner`. False while someone else holds it."""
+        now = time.time()
+        with self.lock:
+            holder, expires = self.leases.get(name, (None, 0))
+            if holder not in (None, owner) and expires > now:
+                return False
+            self.leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name, owner):
+        with self.lock:
+            if self.leases.get(name, (None, 0))[0] == owner:
+                del self.leases[name]
+
+    def claim(self, key, owner, ttl):
+        """Atomically claim `key` once. False if it is already claimed."""
+        now = time.time()
+        with self.lock:
+            if self.claims.get(key, (None, 0))[1] > now:
+                return False
+            self.claims[key] = (owner, now + ttl)
+            return True
+
+
+class SqliteCoordinator:
+    """Leases and claims in a SQLite file shared by processes on the same host."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_claims_expires ON claims (expires);
+        """)
+        self.conn.commit()
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            # One statement, so the take-over check and the write are atomic
+            cur = self.conn.execute("""
+                INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                WHERE leases.owner = excluded.owner OR leases.expires < ?
+            """, (name, owner, now + ttl, now))
+            if cur.rowcount == 1:
+                # The leader also sweeps expired claims
+                self.conn.execute("DELETE FROM claims WHERE expires < ?", (now,))
+            return cur.rowcount == 1
+
+    def release_lease(self, name, owner):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def claim(self, key, owner, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM claims WHERE key = ? AND expires < ?", (key, now))
+            cur = self.conn.execute("INSERT OR IGNORE INTO claims VALUES (?, ?, ?)", (key, owner, now + ttl))
+            return cur.rowcount == 1
+
+
+class RedisCoordinator:
+    """Leases and claims in Redis (or any Redis-compatible store) shared across hosts."""
+
+    RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.renew_script = self.client.register_script(self.RENEW)
+        self.release_script = self.client.register_script(self.RELEASE)
+
+    def acquire_lease(self, name, owner, ttl):
+        key, ttl_ms = f"nexusbot:lease:{name}", int(ttl * 1000)
+        if self.client.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(self.renew_script(keys=[key], args=[owner, ttl_ms]))
+
+    def release_lease(self, name, owner):
+        self.release_script(keys=[f"nexusbot:lease:{name}"], args=[owner])
+
+    def claim(self, key, owner, ttl):
+        return bool(self.client.set(f"nexusbot:claim:{key}", owner, nx=True, ex=max(1, int(ttl))))
+
+
+class LeaderLease:
+    """Holds (or waits for) a named lease from a background thread.
+
+    The lease is renewed every third of its TTL; holds() also checks the
+    local expiry so a stalled renewer stops polling before anyone takes over.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.is_leader = False
+        self.expires = 0
+
+    def renew(self):
+        started = time.time()
+        try:
+            held = get_coordinator().acquire_lease(self.name, INSTANCE_ID, self.ttl)
+        except Exception as e:
+            logger.error(f"Lease renewal failed: {e}")
+            held = False
+        if held:
+            self.expires = started + self.ttl
+        if held != self.is_leader:
+            logger.info(f"👑 {INSTANCE_ID} is now {'leader' if held else 'standby'} for {self.name}")
+        self.is_leader = held
+        return held
+
+    def holds(self):
+        return self.is_leader and time.time() < self.expires
+
+    def release(self):
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                get_coordinator().release_lease(self.name, INSTANCE_ID)
+            except Exception as e:
+                logger.error(f"Lease release failed: {e}")
+
+    def start(self):
+        def run():
+            while True:
+                self.renew()
+                time.sleep(self.ttl / 3)
+        self.renew()
+        threading.Thread(target=run, daemon=True).start()
+        atexit.register(self.release)
+
+
+coordinator = None
+
+def get_coordinator():
+    global coordinator
+    if coordinator is None:
+        if COORDINATION_BACKEND == 'redis' and HAS_REDIS and REDIS_URL:
+            coordinator = RedisCoordinator(REDIS_URL)
+        elif COORDINATION_BACKEND == 'local':
+            coordinator = LocalCoordinator()
+        else:
+            if COORDINATION_BACKEND == 'redis':
+                logger.warning("⚠️ redis or REDIS_URL missing — coordinating through SQLite")
+            coordinator = SqliteCoordinator(COORDINATION_DB)
+        logger.info(f"🤝 Coordination backend: {type(coordinator).__name__} as {INSTANCE_ID}")
+    return coordinator
+
+def claim_otp(msg_id, full_message):
+    """True if this process may send the OTP; fails open so an outage can't drop OTPs.
+
+    Keyed like dedup on (msg_id, full_message), since msg_id only holds the
+    first 30 characters of the SMS.
+    """
+    key = hashlib.sha256(f"{msg_id}\n{full_message}".encode()).hexdigest()
+    try:
+        return get_coordinator().claim(key, INSTANCE_ID, OTP_CLAIM_TTL_SECONDS)
+    except Exception as e:
+        logger.error(f"OTP claim failed, sending anyway: {e}")
+        return True
+
+# Polling IVASMS and serving Telegram updates go together: the number
+# assignments made by the buttons live in the process that routes OTPs.
+# Telegram also allows only one getUpdates consumer per token.
+poller_lease = LeaderLease('poller', LEADER_LEASE_SECONDS)
+
+# ============================================================
+# SINGLE-FLIGHT — merge concurrent blocking upstream work
+# ============================================================
+
+class SingleFlight:
+    """Run at most one call per key; concurrent callers share its result.
+
+    The call runs on its own thread, so async code can await it with
+    asyncio.wrap_future() without blocking the event loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def submit(self, key, fn, *args):
+        with self.lock:
+            future = self.flights.get(key)
+            if future is not None:
+                return future
+            future = concurrent.futures.Future()
+            self.flights[key] = future
+
+        def run():
+            result, error = None, None
+            try:
+                result = fn(*args)
+            except Exception as e:
+                error = e
+            # Drop the key first so callers arriving after completion start a fresh run
+            with self.lock:
+                self.flights.pop(key, None)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def run(self, key, fn, *args):
+        return self.submit(key, fn, *args).result()
+
+    async def run_async(self, key, fn, *args):
+        return await asyncio.wrap_future(self.submit(key, fn, *args))
+
+
+upstream_flights = SingleFlight()
+
+def coordinated_login(account):
+    """ivasms_login(account), merged with any login of that account already in progress."""
+    return upstream_flights.run(f'login:{account.name}', ivasms_login, account)
+
+def login_all():
+    """Log every account in parallel. True if at least one ends up with a session."""
+    futures = [upstream_flights.submit(f'login:{a.name}', ivasms_login, a) for a in accounts]
+    return any([future.result() for future in futures])
 
 # ============================================================
 # LOGIN — from script 2's approach (full browser simulation)
 # ============================================================
 
-def ivasms_login():
-    global ivasms_session, last_login_time, csrf_token, bot_stats
+class LoginCancelled(Exception):
+    pass
+
+def _pause(cancel, low, high):
+    """Random human-ish pause that ends early (and raises) if the login was cancelled."""
+    if cancel.wait(random.uniform(low, high)):
+        raise LoginCancelled()
 
-    logger.info("🔐 Logging into IVASMS (requests method)...")
+def _requests_login(account, cancel):
+    """Plain requests login. Returns (session, csrf_token) or None."""
+    logger.info(f"🔐 [{account.name}] Logging into IVASMS (requests method)...")
     session = requests.Session()
 
     try:
         # Warm up homepage first
         for attempt in range(3):
             try:
-                resp = session.get("https://www.ivasms.com/", headers=BASE_HEADERS.copy(), timeout=15)
+                resp = session.get(f"{IVASMS_BASE_URL}/", headers=BASE_HEADERS.copy(), timeout=15)
                 if resp.status_code == 200:
                     logger.info("✅ Homepage warmed up")
                     break
             except Exception as e:
                 logger.warning(f"Warmup attempt {attempt+1} failed: {e}")
-                time.sleep(random.uniform(2, 4))
+                _pause(cancel, 2, 4)
 
-        time.sleep(random.uniform(1, 2))
+        _pause(cancel, 1, 2)
 
         # Step 1: GET login page for _token
         resp = session.get(LOGIN_URL, headers=BASE_HEADERS.copy(), timeout=20)
@@ -237,12 +1078,12 @@ def ivasms_login():
         if not token_match:
             token_match = re.search(r'<meta name="csrf-token" content="([^"]+)"', resp.text)
         if not token_match:
-            logger.warning("Could not find _token — trying Selenium fallback...")
-            return _selenium_login()
+            logger.warning("Could not find _token")
+            return None
 
         _token = token_match.group(1)
         logger.info(f"✅ Got login token")
-        time.sleep(random.uniform(1, 2))
+        _pause(cancel, 1, 2)
 
         # Step 2: POST credentials
         login_headers = BASE_HEADERS.copy()
@@ -253,12 +1094,12 @@ def ivasms_login():
             "Sec-Fetch-User": "?1",
             "Sec-Fetch-Dest": "document",
             "Referer": LOGIN_URL,
-            "Origin": "https://www.ivasms.com",
+            "Origin": IVASMS_BASE_URL,
         })
         login_data = {
             "_token": _token,
-            "email": IVASMS_EMAIL,
-            "password": IVASMS_PASSWORD,
+            "email": account.email,
+            "password": account.password,
             "remember": "on",
             "g-recaptcha-response": "",
             "submit": "register"
@@ -268,54 +1109,56 @@ def ivasms_login():
         logger.info(f"Login response: {login_resp.status_code} → {login_resp.url}")
 
         if login_resp.url.endswith("/login"):
-            logger.warning("❌ Requests login failed — trying Selenium fallback...")
-            return _selenium_login()
+            logger.warning("❌ Requests login failed")
+            return None
 
-        time.sleep(random.uniform(1, 2))
+        _pause(cancel, 1, 2)
 
         # Step 3: GET portal for CSRF token
         portal_headers = BASE_HEADERS.copy()
         portal_headers.update({
             "Sec-Fetch-Site": "same-origin",
-            "Referer": "https://www.ivasms.com/portal",
+            "Referer": f"{IVASMS_BASE_URL}/portal",
         })
         portal_resp = session.get(PORTAL_URL, headers=portal_headers, timeout=20)
         logger.info(f"Portal: {portal_resp.status_code} → {portal_resp.url}")
 
         if 'login' in portal_resp.url:
-            logger.warning("❌ Portal blocked — trying Selenium fallback...")
-            return _selenium_login()
+            logger.warning("❌ Portal blocked")
+            return None
 
         csrf_match = re.search(r'<meta name="csrf-token" content="([^"]+)"', portal_resp.text)
         if not csrf_match:
-            logger.warning("No CSRF in portal — trying Selenium fallback...")
-            return _selenium_login()
-
-        csrf_token = csrf_match.group(1)
-        ivasms_session = session
-        last_login_time = time.time()
-        bot_stats['session_valid'] = True
-        bot_stats['consecutive_failures'] = 0
+            logger.warning("No CSRF in portal")
+            return None
+
         logger.info("✅ Requests login successful!")
-        return True
+        return session, csrf_match.group(1)
 
+    except LoginCancelled:
+        raise
     except Exception as e:
-        logger.error(f"Requests login error: {e} — trying Selenium fallback...")
-        return _selenium_login()
+        logger.error(f"Requests login error: {e}")
+        return None
 
 
-def _selenium_login():
-    """Selenium fallback using undetected-chromedriver."""
-    global ivasms_session, last_login_time, csrf_token, bot_stats
+class BrowserService:
+    """One warm undetected Chrome for one account's Selenium logins.
 
-    if not HAS_SELENIUM:
-        logger.error("❌ Selenium not available and requests failed. Login impossible.")
-        bot_stats['session_valid'] = False
-        return False
+    The profile lives under BROWSER_PROFILE_DIR so Cloudflare clearance and
+    login cookies survive between renewals and restarts. The browser is
+    recycled after BROWSER_MAX_LOGINS logins, BROWSER_MAX_AGE seconds, or
+    when its process tree grows past BROWSER_MAX_RSS_MB.
+    """
 
-    logger.info("🤖 Trying Selenium login...")
-    driver = None
-    try:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.driver = None
+        self.started_at = 0
+        self.logins = 0
+        self.last_timings = {}
+
+    def _start(self, account):
         options = uc.ChromeOptions()
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
@@ -325,7 +1168,6 @@ def _selenium_login():
         options.add_argument(f"--user-agent={BASE_HEADERS['User-Agent']}")
 
         # Find Chrome binary — check common Render/Linux locations
-        import shutil
         chrome_binary = (
             shutil.which("google-chrome") or
             shutil.which("google-chrome-stable") or
@@ -340,70 +1182,201 @@ def _selenium_login():
         else:
             logger.warning("Chrome binary not found in PATH — letting uc find it")
 
-        driver = uc.Chrome(options=options, version_main=None)
-        logger.info("✅ Chrome driver started")
-
-        # Warm up
-        driver.get("https://www.ivasms.com/")
-        time.sleep(random.uniform(2, 4))
-
-        # Go to login
-        driver.get(LOGIN_URL)
-        time.sleep(random.uniform(3, 5))
+        # One profile per account so each keeps its own clearance and login cookies
+        profile_dir = os.path.abspath(os.path.join(BROWSER_PROFILE_DIR, account.name))
+        os.makedirs(profile_dir, exist_ok=True)
+        self.driver = uc.Chrome(options=options, version_main=None, user_data_dir=profile_dir)
+        self.started_at = time.time()
+        self.logins = 0
+        logger.info(f"✅ [{account.name}] Chrome driver started")
+
+    def rss_mb(self):
+        """Resident memory of the browser and all its child processes (Linux /proc)."""
+        pid = getattr(self.driver, 'browser_pid', None)
+        if not pid or not os.path.isdir('/proc'):
+            return 0
+        children = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+        total_kb, stack = 0, [pid]
+        while stack:
+            current = stack.pop()
+            stack.extend(children.get(current, []))
+            try:
+                with open(f'/proc/{current}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                continue
+        return total_kb / 1024
+
+    def _recycle_reason(self):
+        if self.logins >= BROWSER_MAX_LOGINS:
+            return f"{self.logins} logins"
+        if time.time() - self.started_at >= BROWSER_MAX_AGE:
+            return "max age"
+        rss = self.rss_mb()
+        if rss > BROWSER_MAX_RSS_MB:
+            return f"RSS {rss:.0f} MB"
+        try:
+            self.driver.current_url
+        except Exception:
+            return "driver unresponsive"
+        return None
 
-        # Wait for CF to clear and form to appear (up to 40s)
-        logger.info("⏳ Waiting for login form...")
-        for i in range(40):
+    def stop(self):
+        if self.driver:
             try:
-                el = driver.find_element(By.NAME, "email")
-                if el:
-                    logger.info(f"✅ Login form found after {i+1}s")
-                    break
+                self.driver.quit()
             except Exception:
                 pass
-            time.sleep(1)
-        else:
-            logger.error("❌ Login form never appeared (CF still blocking)")
-            bot_stats['session_valid'] = False
-            return False
+        self.driver = None
 
-        # Type email
-        email_input = driver.find_element(By.NAME, "email")
-        for char in IVASMS_EMAIL:
-            email_input.send_keys(char)
-            time.sleep(random.uniform(0.05, 0.15))
+    @contextlib.contextmanager
+    def step(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.last_timings[name] = time.time() - started
+
+    @contextlib.contextmanager
+    def session(self, account, cancel):
+        """Yield a driver on `account`'s profile; only one login uses the browser at a time."""
+        with self.lock:
+            # The race may have been decided while we waited; don't start or recycle Chrome for nothing
+            if cancel.is_set():
+                raise LoginCancelled()
+            self.last_timings = {}
+            if self.driver is not None:
+                reason = self._recycle_reason()
+                if reason:
+                    logger.info(f"♻️ [{account.name}] Recycling Chrome ({reason})")
+                    self.stop()
+            if self.driver is None:
+                with self.step('start'):
+                    self._start(account)
+            try:
+                yield self.driver
+            except LoginCancelled:
+                raise
+            except Exception:
+                # A failed login may leave the browser in a bad state
+                self.stop()
+                raise
+            finally:
+                self.logins += 1
+                if not BROWSER_KEEP_WARM:
+                    self.stop()
+                timings = ', '.join(f"{k} {v:.1f}s" for k, v in self.last_timings.items())
+                logger.info(f"⏱ [{account.name}] Selenium login steps: {timings}")
+
+
+# Account name -> its own warm browser, so logins of different accounts
+# neither queue behind one lock nor restart Chrome to switch profiles
+browser_services = {}
+browser_services_lock = threading.Lock()
+
+def get_browser_service(account):
+    with browser_services_lock:
+        return browser_services.setdefault(account.name, BrowserService())
+
+def _wait_for(driver, by, value, timeout, cancel):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return driver.find_element(by, value)
+        except Exception:
+            _pause(cancel, 0.5, 0.5)
+    return None
 
-        time.sleep(random.uniform(0.5, 1))
+def _selenium_login(account, cancel):
+    """Browser login using the account's warm Chrome. Returns (session, csrf_token) or None."""
 
-        # Type password
-        pass_input = driver.find_element(By.NAME, "password")
-        for char in IVASMS_PASSWORD:
-            pass_input.send_keys(char)
-            time.sleep(random.uniform(0.05, 0.15))
+    if not HAS_SELENIUM:
+        logger.error("❌ Selenium not available")
+        return None
 
-        time.sleep(random.uniform(0.5, 1))
+    logger.info(f"🤖 [{account.name}] Trying Selenium login...")
+    try:
+        if cancel.is_set():
+            raise LoginCancelled()
+        browser = get_browser_service(account)
+        with browser.session(account, cancel) as driver:
+            step = browser.step
+            fresh_browser = browser.logins == 0
+
+            # Warm up — only needed the first time a profile sees the site
+            if fresh_browser:
+                with step('warmup'):
+                    driver.get(f"{IVASMS_BASE_URL}/")
+                    _pause(cancel, 2, 4)
+
+            # Go to login — a warm profile that's still logged in lands on the portal
+            with step('login_page'):
+                driver.get(LOGIN_URL)
+                _pause(cancel, 1, 2)
+
+            if 'login' in driver.current_url:
+                # Wait for CF to clear and form to appear (up to 40s)
+                logger.info("⏳ Waiting for login form...")
+                with step('form_wait'):
+                    email_input = _wait_for(driver, By.NAME, "email", 40, cancel)
+                if email_input is None:
+                    logger.error("❌ Login form never appeared (CF still blocking)")
+                    return None
+
+                with step('typing'):
+                    email_input.clear()
+                    for char in account.email:
+                        email_input.send_keys(char)
+                        _pause(cancel, 0.05, 0.15)
+
+                    _pause(cancel, 0.5, 1)
+
+                    pass_input = driver.find_element(By.NAME, "password")
+                    pass_input.clear()
+                    for char in account.password:
+                        pass_input.send_keys(char)
+                        _pause(cancel, 0.05, 0.15)
+
+                    _pause(cancel, 0.5, 1)
+
+                # Submit and wait for the redirect away from /login
+                with step('submit'):
+                    driver.find_element(By.XPATH, "//button[@type='submit']").click()
+                    deadline = time.time() + 15
+                    while 'login' in driver.current_url and time.time() < deadline:
+                        _pause(cancel, 0.5, 0.5)
+            else:
+                logger.info("✅ Browser profile still logged in — skipping the form")
 
-        # Submit
-        driver.find_element(By.XPATH, "//button[@type='submit']").click()
-        time.sleep(random.uniform(4, 6))
+            current_url = driver.current_url
+            logger.info(f"After Selenium login URL: {current_url}")
 
-        current_url = driver.current_url
-        logger.info(f"After Selenium login URL: {current_url}")
+            if 'login' in current_url:
+                logger.error("❌ Selenium login failed")
+                return None
 
-        if 'login' in current_url:
-            logger.error("❌ Selenium login also failed")
-            bot_stats['session_valid'] = False
-            return False
+            # Extract cookies into requests session
+            selenium_cookies = driver.get_cookies()
 
-        # Extract cookies into requests session
-        selenium_cookies = driver.get_cookies()
         session = requests.Session()
         session.headers.update({'User-Agent': BASE_HEADERS['User-Agent']})
         for cookie in selenium_cookies:
             session.cookies.set(
                 cookie['name'],
                 cookie['value'],
-                domain=cookie.get('domain', 'www.ivasms.com')
+                domain=cookie.get('domain', urlparse(IVASMS_BASE_URL).hostname)
             )
         logger.info(f"✅ Extracted {len(selenium_cookies)} cookies from Selenium")
 
@@ -411,202 +1384,545 @@ def _selenium_login():
         portal_resp = session.get(PORTAL_URL, timeout=20)
         csrf_match = re.search(r'<meta name="csrf-token" content="([^"]+)"', portal_resp.text)
         if csrf_match:
-            csrf_token = csrf_match.group(1)
             logger.info("✅ Got CSRF token from Selenium session")
 
-        ivasms_session = session
-        last_login_time = time.time()
-        bot_stats['session_valid'] = True
-        bot_stats['consecutive_failures'] = 0
         logger.info("✅ Selenium login successful!")
-        return True
+        return session, csrf_match.group(1) if csrf_match else account.csrf_token
 
+    except LoginCancelled:
+        raise
     except Exception as e:
         logger.error(f"Selenium login error: {e}")
-        bot_stats['session_valid'] = False
-        return False
-    finally:
-        if driver:
+        return None
+
+
+# ============================================================
+# LOGIN COORDINATOR — race strategies, prefer the one that worked last
+# ============================================================
+
+LOGIN_STRATEGIES = {
+    'requests': _requests_login,
+    'browser': _selenium_login,
+}
+
+def _login_order(account):
+    names = [name for name in LOGIN_STRATEGIES if name != 'browser' or HAS_SELENIUM]
+    # Most recent success first; never-succeeded strategies keep their default order
+    return sorted(names, key=lambda name: -account.strategy_stats[name]['last_success'])
+
+def _run_strategy(account, name, cancel):
+    started = time.time()
+    try:
+        result = LOGIN_STRATEGIES[name](account, cancel)
+    except LoginCancelled:
+        logger.info(f"🛑 [{account.name}] {name} login cancelled — another strategy won")
+        LOGIN_SECONDS.labels(name, 'cancelled').observe(time.time() - started)
+        return None
+    except Exception as e:
+        logger.error(f"[{account.name}] {name} login error: {e}")
+        result = None
+    stats = account.strategy_stats[name]
+    stats['last_duration'] = time.time() - started
+    LOGIN_SECONDS.labels(name, 'success' if result else 'failure').observe(stats['last_duration'])
+    # last_success is set by ivasms_login for the winner only, so a late loser can't reorder strategies
+    if not result:
+        stats['last_failure'] = time.time()
+    return result
+
+def ivasms_login(account):
+    """Log `account` in with the available strategies and install the winning session.
+
+    LOGIN_MODE=race starts the strategies together (the one that worked
+    last gets a LOGIN_RACE_HEAD_START) and cancels the losers;
+    LOGIN_MODE=sequential tries them one after another in the same order.
+    """
+    order = _login_order(account)
+    cancel = threading.Event()
+    winner = None
+
+    if LOGIN_MODE == 'race' and len(order) > 1:
+        results = queue.Queue()
+
+        def run(name):
+            results.put((name, _run_strategy(account, name, cancel)))
+
+        threading.Thread(target=run, args=(order[0],), daemon=True).start()
+        pending = 1
+        if account.strategy_stats[order[0]]['last_success'] and LOGIN_RACE_HEAD_START > 0:
             try:
-                driver.quit()
-            except Exception:
+                name, result = results.get(timeout=LOGIN_RACE_HEAD_START)
+                pending -= 1
+                if result:
+                    winner = (name, result)
+            except queue.Empty:
                 pass
+        if winner is None:
+            for name in order[1:]:
+                threading.Thread(target=run, args=(name,), daemon=True).start()
+                pending += 1
+            while pending and winner is None:
+                name, result = results.get()
+                pending -= 1
+                if result:
+                    winner = (name, result)
+        cancel.set()
+    else:
+        for name in order:
+            result = _run_strategy(account, name, cancel)
+            if result:
+                winner = (name, result)
+                break
+
+    if winner is None:
+        logger.error(f"❌ [{account.name}] All login strategies failed")
+        account.session_valid = False
+        _update_session_stats()
+        return False
+
+    name, (session, token) = winner
+    account.strategy_stats[name]['last_success'] = time.time()
+    _set_session(account, session, token)
+    logger.info(f"🏁 [{account.name}] Logged in via {name} in {account.strategy_stats[name]['last_duration']:.1f}s")
+    save_session(account)
+    numbers_inventory.invalidate()
+    return True
 
 
-def refresh_session_if_needed():
-    global last_login_time
-    # Re-login every 90 minutes
-    if time.time() - last_login_time >= 5400:
-        logger.info("🔄 Session refresh (90min)...")
-        ivasms_login()
+def _set_session(account, session, token, login_time=None):
+    account.session = session
+    account.csrf_token = token
+    account.last_login_time = login_time or time.time()
+    account.generation += 1
+    account.session_valid = True
+    _update_session_stats()
+    bot_stats['consecutive_failures'] = 0
 
 # ============================================================
-# SMS FETCHING — merged best of both scripts
+# SESSION EXPIRY — detect on every response, renew once, replay
 # ============================================================
 
-def fetch_sms_ranges():
-    global csrf_token
-    try:
-        today = datetime.now()
-        from_date = today.strftime("%m/%d/%Y")
-        to_date = (today + timedelta(days=1)).strftime("%m/%d/%Y")
-
-        boundary = "----WebKitFormBoundaryhkp0qMozYkZV6Ham"
-        headers = BASE_HEADERS.copy()
-        headers.update({
-            "Content-Type": f"multipart/form-data; boundary={boundary}",
-            "X-Requested-With": "XMLHttpRequest",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Dest": "empty",
-            "Referer": PORTAL_URL,
-            "Origin": "https://www.ivasms.com",
-        })
+class SessionExpired(Exception):
+    pass
 
-        body = (
-            f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
-            f"Content-Disposition: form-data; name=\"from\"\r\n\r\n{from_date}\r\n"
-            f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
-            f"Content-Disposition: form-data; name=\"to\"\r\n\r\n{to_date}\r\n"
-            f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
-            f"Content-Disposition: form-data; name=\"_token\"\r\n\r\n{csrf_token}\r\n"
-            f"------WebKitFormBoundaryhkp0qMozYkZV6Ham--\r\n"
-        )
+def is_session_expired(status_code, url, location='', text='', expect_csrf=False):
+    """True if an upstream response means we're logged out.
 
-        resp = ivasms_session.post(SMS_LIST_URL, headers=headers, data=body, timeout=30)
-        logger.info(f"SMS ranges response: {resp.status_code}")
+    Laravel answers 419 to a stale CSRF token and redirects to /login when
+    the auth cookie is gone; AJAX calls sometimes get the login page inline.
+    Full portal pages must carry a csrf-token meta tag.
+    """
+    if status_code in (401, 419):
+        return True
+    if '/login' in str(url) or (300 <= status_code < 400 and '/login' in (location or '')):
+        return True
+    if status_code == 200 and 'name="password"' in text:
+        return True
+    if expect_csrf and status_code == 200 and 'name="csrf-token"' not in text:
+        return True
+    return False
 
-        if resp.status_code != 200:
-            return []
+def renew_session(account, seen_generation):
+    """Log `account` in again unless someone already did since `seen_generation`. Returns True if usable."""
+    with account.renew_lock:
+        if account.generation != seen_generation:
+            return account.session_valid
+        logger.warning(f"🔐 [{account.name}] Session expired — renewing")
+        account.session_valid = False
+        _update_session_stats()
+        return coordinated_login(account)
+
+def ivasms_request(account, method, url, build=None, expect_csrf=False, **kwargs):
+    """Send one upstream request; on session expiry renew once and replay it.
+
+    `build` is called before each attempt to produce headers/data, so the
+    replay picks up the new CSRF token.
+    """
+    for attempt in (1, 2):
+        generation = account.generation
+        if build:
+            kwargs.update(build())
+        started = time.perf_counter()
+        resp = account.session.request(method, url, **kwargs)
+        UPSTREAM_SECONDS.labels(_endpoint_name(url)).observe(time.perf_counter() - started)
+        location = resp.history[0].headers.get('Location', '') if resp.history else resp.headers.get('Location', '')
+        if not is_session_expired(resp.status_code, resp.url, location, resp.text, expect_csrf):
+            return resp
+        if attempt == 2 or not renew_session(account, generation):
+            raise SessionExpired(f"{url} still logged out after renewal")
+
+async def ivasms_request_async(account, client, method, url, build=None, **kwargs):
+    """httpx version of ivasms_request; updates the client's cookies after a renewal."""
+    for attempt in (1, 2):
+        generation = account.generation
+        if build:
+            kwargs.update(build())
+        if isinstance(kwargs.get('data'), str):
+            # httpx wants raw bodies (the multipart getsms form) as content=
+            kwargs['content'] = kwargs.pop('data')
+        started = time.perf_counter()
+        resp = await client.request(method, url, **kwargs)
+        UPSTREAM_SECONDS.labels(_endpoint_name(url)).observe(time.perf_counter() - started)
+        if not is_session_expired(resp.status_code, resp.url, resp.headers.get('Location', ''), resp.text):
+            return resp
+        if attempt == 2 or not await asyncio.to_thread(renew_session, account, generation):
+            raise SessionExpired(f"{url} still logged out after renewal")
+        client.cookies = account.session.cookies
+
+def refresh_session_if_needed(account):
+    """Optional keep-alive: probe the portal every SESSION_KEEPALIVE_SECONDS, renew if it fails."""
+    if SESSION_KEEPALIVE_SECONDS <= 0 or time.time() - account.last_keepalive < SESSION_KEEPALIVE_SECONDS:
+        return
+    account.last_keepalive = time.time()
+    generation = account.generation
+    fresh_csrf = probe_session(account.session)
+    if fresh_csrf:
+        account.csrf_token = fresh_csrf
+    else:
+        renew_session(account, generation)
 
-        # Parse ranges — try both parsing methods
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        ranges = []
-
-        # Method from script 2 (card-based)
-        cards = soup.find_all('div', class_='card card-body mb-1 pointer')
-        for card in cards:
-            onclick = card.get('onclick', '')
-            range_id_match = re.search(r"getDetials\('([^']+)'\)", onclick)
-            if range_id_match:
-                ranges.append(range_id_match.group(1))
-
-        # Fallback: method from original script (item-based)
-        if not ranges:
-            items = soup.find_all('div', class_='item')
-            for item in items:
-                range_div = item.find('div', class_='col-sm-4')
-                if range_div:
-                    ranges.append(range_div.text.strip())
+# ============================================================
+# SESSION PERSISTENCE — encrypted cookies for warm restarts
+# ============================================================
 
-        logger.info(f"Found ranges: {ranges}")
-        return ranges
+def _session_cipher(account):
+    if not HAS_CRYPTO:
+        return None
+    secret = SESSION_SECRET or f"{BOT_TOKEN}:{account.email}:{account.password}"
+    key = hashlib.pbkdf2_hmac('sha256', secret.encode(), b'nexusbot-ivasms-session', 100_000)
+    return Fernet(base64.urlsafe_b64encode(key))
 
+def save_session(account):
+    cipher = _session_cipher(account)
+    if cipher is None or account.session is None:
+        return
+    try:
+        state = {
+            'email': account.email,
+            'csrf_token': account.csrf_token,
+            'login_time': account.last_login_time,
+            'cookies': [
+                {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+                 'expires': c.expires, 'secure': c.secure}
+                for c in account.session.cookies
+            ],
+        }
+        atomic_write(account.session_file, cipher.encrypt(json.dumps(state).encode()), mode=0o600)
+        logger.info(f"💾 [{account.name}] Session saved ({len(state['cookies'])} cookies)")
     except Exception as e:
-        logger.error(f"Error fetching ranges: {e}")
-        return []
+        logger.error(f"[{account.name}] Error saving session: {e}")
+
+def probe_session(session):
+    """Cheap validity check: one portal GET. Returns a fresh CSRF token, or None if logged out."""
+    headers = BASE_HEADERS.copy()
+    headers.update({
+        "Sec-Fetch-Site": "same-origin",
+        "Referer": f"{IVASMS_BASE_URL}/portal",
+    })
+    try:
+        resp = session.get(PORTAL_URL, headers=headers, timeout=10)
+        if resp.status_code != 200 or 'login' in resp.url:
+            return None
+        csrf_match = re.search(r'<meta name="csrf-token" content="([^"]+)"', resp.text)
+        return csrf_match.group(1) if csrf_match else None
+    except Exception as e:
+        logger.warning(f"Session probe failed: {e}")
+        return None
+
+def restore_session(account):
+    """Reuse `account`'s saved session if the portal still accepts it. Returns True on success."""
+    cipher = _session_cipher(account)
+    if cipher is None:
+        logger.warning("⚠️ cryptography not available — sessions are not persisted")
+        return False
+    if not os.path.exists(account.session_file):
+        return False
 
-def fetch_numbers_for_range(range_name):
-    global csrf_token
     try:
-        today = datetime.now()
-        to_date = (today + timedelta(days=1)).strftime("%m/%d/%Y")
+        with open(account.session_file, 'rb') as f:
+            state = json.loads(cipher.decrypt(f.read()))
+    except (InvalidToken, ValueError) as e:
+        logger.warning(f"Saved session unreadable ({type(e).__name__}) — ignoring it")
+        return False
+    except Exception as e:
+        logger.error(f"Error loading saved session: {e}")
+        return False
 
-        headers = BASE_HEADERS.copy()
-        headers.update({
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "X-Requested-With": "XMLHttpRequest",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Dest": "empty",
-            "Referer": PORTAL_URL,
-            "Origin": "https://www.ivasms.com",
-        })
+    if state.get('email') != account.email:
+        logger.info("Saved session belongs to another account — ignoring it")
+        return False
 
-        data = {
-            "_token": csrf_token,
-            "start": "",
-            "end": to_date,
-            "range": range_name
-        }
+    session = requests.Session()
+    for c in state.get('cookies', []):
+        session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path') or '/',
+                            expires=c.get('expires'), secure=c.get('secure', False))
 
-        resp = ivasms_session.post(SMS_NUMBERS_URL, headers=headers, data=data, timeout=30)
-        soup = BeautifulSoup(resp.text, 'html.parser')
+    fresh_csrf = probe_session(session)
+    if not fresh_csrf:
+        logger.info(f"[{account.name}] Saved session expired — full login needed")
+        return False
 
-        numbers = []
+    _set_session(account, session, fresh_csrf, login_time=state.get('login_time'))
+    logger.info(f"⚡ [{account.name}] Restored saved IVASMS session")
+    return True
 
-        # Script 2 parsing (card-based with onclick)
-        number_divs = soup.find_all('div', class_='card card-body border-bottom bg-100 p-2 rounded-0')
-        for div in number_divs:
-            col = div.find('div', class_=re.compile(r'col'))
-            if col:
-                onclick = col.get('onclick', '')
-                match = re.search(r"'([^']+)','([^']+)'", onclick)
-                if match:
-                    numbers.append(match.group(1))
+# ============================================================
+# HTML EXTRACTION — lxml fast path, BeautifulSoup fallback
+# ============================================================
 
-        # Fallback: original parsing
-        if not numbers:
-            divs = soup.find_all('div', class_='col-sm-4')
-            numbers = [d.text.strip() for d in divs if d.text.strip()]
+def _xpath_has_class(*classes):
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {c} ')" for c in classes)
 
-        return numbers
+def _card_count_lxml(card):
+    for p in card.iterfind('.//p'):
+        text = p.text_content().strip()
+        if text.isdigit():
+            return int(text)
+    return None
 
-    except Exception as e:
-        logger.error(f"Error fetching numbers for {range_name}: {e}")
+def _range_cards_lxml(html):
+    if not html.strip():
         return []
+    doc = lxml.html.fromstring(html)
+    ranges = []
+    for card in doc.xpath("//div[@class='card card-body mb-1 pointer']"):
+        range_id_match = re.search(r"getDetials\('([^']+)'\)", card.get('onclick', ''))
+        if range_id_match:
+            ranges.append((range_id_match.group(1), _card_count_lxml(card)))
+    if not ranges:
+        for range_div in doc.xpath(f"//div[{_xpath_has_class('item')}]"):
+            col = range_div.xpath(f".//div[{_xpath_has_class('col-sm-4')}]")
+            if col:
+                ranges.append((col[0].text_content().strip(), None))
+    return ranges
 
-def fetch_sms_for_number(number, range_name):
-    global csrf_token
-    try:
-        today = datetime.now()
-        to_date = (today + timedelta(days=1)).strftime("%m/%d/%Y")
+def _number_cards_lxml(html):
+    if not html.strip():
+        return []
+    doc = lxml.html.fromstring(html)
+    numbers = []
+    for card in doc.xpath("//div[@class='card card-body border-bottom bg-100 p-2 rounded-0']"):
+        col = card.xpath(".//div[contains(@class, 'col')]")
+        if col:
+            match = re.search(r"'([^']+)','([^']+)'", col[0].get('onclick', ''))
+            if match:
+                numbers.append((match.group(1), _card_count_lxml(card)))
+    if not numbers:
+        for div in doc.xpath(f"//div[{_xpath_has_class('col-sm-4')}]"):
+            text = div.text_content().strip()
+            if text:
+                numbers.append((text, None))
+    return numbers
+
+def _sms_lxml(html):
+    if not html.strip():
+        return []
+    doc = lxml.html.fromstring(html)
+    messages = []
+    for div in doc.xpath("//div[@class='col-9 col-sm-6 text-center text-sm-start']"):
+        p = div.find('.//p')
+        if p is not None:
+            messages.append(p.text_content().strip())
+    if not messages:
+        paragraphs = doc.xpath(f"//div[{_xpath_has_class('col-9', 'col-sm-6')}]//p[{_xpath_has_class('mb-0', 'pb-0')}]")
+        messages = [p.text_content().strip() for p in paragraphs]
+    return messages
 
-        headers = BASE_HEADERS.copy()
-        headers.update({
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "X-Requested-With": "XMLHttpRequest",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Dest": "empty",
-            "Referer": PORTAL_URL,
-            "Origin": "https://www.ivasms.com",
-        })
+def _card_count_bs4(card):
+    # Range and number cards show their SMS count in the first numeric <p>
+    for p in card.find_all('p'):
+        text = p.get_text(strip=True)
+        if text.isdigit():
+            return int(text)
+    return None
+
+def _range_cards_bs4(html):
+    # Parse ranges — try both parsing methods
+    soup = BeautifulSoup(html, 'html.parser')
+    ranges = []
+
+    # Method from script 2 (card-based)
+    cards = soup.find_all('div', class_='card card-body mb-1 pointer')
+    for card in cards:
+        onclick = card.get('onclick', '')
+        range_id_match = re.search(r"getDetials\('([^']+)'\)", onclick)
+        if range_id_match:
+            ranges.append((range_id_match.group(1), _card_count_bs4(card)))
+
+    # Fallback: method from original script (item-based)
+    if not ranges:
+        items = soup.find_all('div', class_='item')
+        for item in items:
+            range_div = item.find('div', class_='col-sm-4')
+            if range_div:
+                ranges.append((range_div.text.strip(), None))
+
+    return ranges
+
+def _number_cards_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    numbers = []
+
+    # Script 2 parsing (card-based with onclick)
+    number_divs = soup.find_all('div', class_='card card-body border-bottom bg-100 p-2 rounded-0')
+    for div in number_divs:
+        col = div.find('div', class_=re.compile(r'col'))
+        if col:
+            onclick = col.get('onclick', '')
+            match = re.search(r"'([^']+)','([^']+)'", onclick)
+            if match:
+                numbers.append((match.group(1), _card_count_bs4(div)))
+
+    # Fallback: original parsing
+    if not numbers:
+        divs = soup.find_all('div', class_='col-sm-4')
+        numbers = [(d.text.strip(), None) for d in divs if d.text.strip()]
+
+    return numbers
+
+def _sms_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    messages = []
 
-        data = {
-            "_token": csrf_token,
-            "start": "",
-            "end": to_date,
-            "Number": number,
-            "Range": range_name
-        }
+    # Script 2 parsing
+    msg_divs = soup.find_all('div', class_='col-9 col-sm-6 text-center text-sm-start')
+    for div in msg_divs:
+        p = div.find('p')
+        if p:
+            messages.append(p.text.strip())
+
+    # Fallback: original parsing
+    if not messages:
+        msg_divs = soup.select('div.col-9.col-sm-6 p.mb-0.pb-0')
+        messages = [d.text.strip() for d in msg_divs]
 
-        resp = ivasms_session.post(SMS_DETAILS_URL, headers=headers, data=data, timeout=30)
-        soup = BeautifulSoup(resp.text, 'html.parser')
+    return messages
 
-        messages = []
+def _extract(kind, fast, slow, html):
+    with PARSE_SECONDS.labels(kind).time():
+        if HTML_PARSER != 'bs4' and HAS_LXML:
+            try:
+                return fast(html)
+            except Exception as e:
+                logger.warning(f"lxml extraction failed ({e}) — falling back to BeautifulSoup")
+        return slow(html)
 
-        # Script 2 parsing
-        msg_divs = soup.find_all('div', class_='col-9 col-sm-6 text-center text-sm-start')
-        for div in msg_divs:
-            p = div.find('p')
-            if p:
-                messages.append(p.text.strip())
+def parse_range_cards(html):
+    """Return [(range_name, sms_count)] — count is None when the page doesn't show one."""
+    return _extract('ranges', _range_cards_lxml, _range_cards_bs4, html)
 
-        # Fallback: original parsing
-        if not messages:
-            msg_divs = soup.select('div.col-9.col-sm-6 p.mb-0.pb-0')
-            messages = [d.text.strip() for d in msg_divs]
+def parse_sms_ranges(html):
+    return [name for name, _ in parse_range_cards(html)]
 
-        return messages
+def parse_number_cards(html):
+    """Return [(number, sms_count)] for one range."""
+    return _extract('numbers', _number_cards_lxml, _number_cards_bs4, html)
+
+def parse_numbers_for_range(html):
+    return [number for number, _ in parse_number_cards(html)]
+
+def parse_sms_for_number(html):
+    return _extract('sms', _sms_lxml, _sms_bs4, html)
+
+# ============================================================
+# SMS FETCHING — merged best of both scripts
+# ============================================================
+
+def _ajax_headers(content_type):
+    headers = BASE_HEADERS.copy()
+    headers.update({
+        "Content-Type": content_type,
+        "X-Requested-With": "XMLHttpRequest",
+        "Sec-Fetch-Site": "same-origin",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Dest": "empty",
+        "Referer": PORTAL_URL,
+        "Origin": IVASMS_BASE_URL,
+    })
+    return headers
+
+def _sms_ranges_request(account):
+    today = datetime.now()
+    from_date = today.strftime("%m/%d/%Y")
+    to_date = (today + timedelta(days=1)).strftime("%m/%d/%Y")
+
+    boundary = "----WebKitFormBoundaryhkp0qMozYkZV6Ham"
+    headers = _ajax_headers(f"multipart/form-data; boundary={boundary}")
+
+    body = (
+        f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
+        f"Content-Disposition: form-data; name=\"from\"\r\n\r\n{from_date}\r\n"
+        f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
+        f"Content-Disposition: form-data; name=\"to\"\r\n\r\n{to_date}\r\n"
+        f"------WebKitFormBoundaryhkp0qMozYkZV6Ham\r\n"
+        f"Content-Disposition: form-data; name=\"_token\"\r\n\r\n{account.csrf_token}\r\n"
+        f"------WebKitFormBoundaryhkp0qMozYkZV6Ham--\r\n"
+    )
+    return {'headers': headers, 'data': body}
+
+def _numbers_request(account, range_name):
+    to_date = (datetime.now() + timedelta(days=1)).strftime("%m/%d/%Y")
+    headers = _ajax_headers("application/x-www-form-urlencoded; charset=UTF-8")
+    data = {
+        "_token": account.csrf_token,
+        "start": "",
+        "end": to_date,
+        "range": range_name
+    }
+    return {'headers': headers, 'data': data}
+
+def _sms_request(account, number, range_name):
+    to_date = (datetime.now() + timedelta(days=1)).strftime("%m/%d/%Y")
+    headers = _ajax_headers("application/x-www-form-urlencoded; charset=UTF-8")
+    data = {
+        "_token": account.csrf_token,
+        "start": "",
+        "end": to_date,
+        "Number": number,
+        "Range": range_name
+    }
+    return {'headers': headers, 'data': data}
+
+def fetch_sms_ranges(account=None):
+    account = account or accounts[0]
+    try:
+        resp = ivasms_request(account, 'POST', SMS_LIST_URL, build=lambda: _sms_ranges_request(account), timeout=30)
+        logger.info(f"SMS ranges response: {resp.status_code}")
+
+        if resp.status_code != 200:
+            return []
+
+        ranges = parse_sms_ranges(resp.text)
+        logger.info(f"Found ranges: {ranges}")
+        return ranges
+
+    except Exception as e:
+        logger.error(f"Error fetching ranges: {e}")
+        return []
+
+def fetch_numbers_for_range(range_name, account=None):
+    account = account or accounts[0]
+    try:
+        resp = ivasms_request(account, 'POST', SMS_NUMBERS_URL, build=lambda: _numbers_request(account, range_name), timeout=30)
+        return parse_numbers_for_range(resp.text)
+
+    except Exception as e:
+        logger.error(f"Error fetching numbers for {range_name}: {e}")
+        return []
+
+def fetch_sms_for_number(number, range_name, account=None):
+    account = account or number_accounts.get(number) or accounts[0]
+    try:
+        resp = ivasms_request(account, 'POST', SMS_DETAILS_URL, build=lambda: _sms_request(account, number, range_name), timeout=30)
+        return parse_sms_for_number(resp.text)
 
     except Exception as e:
         logger.error(f"Error fetching SMS for {number}: {e}")
         return []
 
-def get_ivasms_numbers():
+def get_ivasms_numbers(account=None):
+    account = account or accounts[0]
     try:
-        resp = ivasms_session.get(NUMBERS_PAGE_URL, headers=BASE_HEADERS, timeout=15)
+        resp = ivasms_request(account, 'GET', NUMBERS_PAGE_URL, headers=BASE_HEADERS, expect_csrf=True, timeout=15)
         soup = BeautifulSoup(resp.content, 'html.parser')
         numbers = []
         tables = soup.find_all('table')
@@ -618,73 +1934,582 @@ def get_ivasms_numbers():
                     numbers.append([c.get_text(strip=True) for c in cells])
         return numbers
     except Exception as e:
-        logger.error(f"Error fetching numbers page: {e}")
+        logger.error(f"[{account.name}] Error fetching numbers page: {e}")
         return []
 
-def get_received_sms():
-    messages = []
+def get_all_ivasms_numbers():
+    """Numbers page rows from every logged-in account, merged; records which account owns each number."""
+    live = [a for a in accounts if a.session is not None]
+    if not live:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(live)) as pool:
+        per_account = list(pool.map(get_ivasms_numbers, live))
+    rows = []
+    for account, account_rows in zip(live, per_account):
+        for row in account_rows:
+            number_accounts[row[0]] = account
+            rows.append(row)
+    return rows
+
+def build_otp_message(number, range_name, sms_text, account=None):
+    """Turn one SMS into the dict the senders expect, or None if it has no new OTP."""
+    otp = extract_otp(sms_text)
+    if not otp:
+        return None
+
+    msg_id = f"{number}_{otp}_{sms_text[:30]}"
+    if is_otp_already_sent(msg_id, sms_text):
+        return None
+
+    country_name = extract_country_from_range(range_name)
+    country_emoji = get_range_emoji(range_name, number)
+    return {
+        'id': msg_id,
+        'phone': number,
+        'otp': otp,
+        'service': extract_service(sms_text),
+        'message': sms_text,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'country': f"{country_emoji} {country_name}",
+        'range': range_name,
+        'account': account.name if account else None,
+        'discovered_at': time.time(),
+    }
+
+# ============================================================
+# ASYNC CRAWL ENGINE
+# ============================================================
+
+# Each account keeps its own snapshot (IvasmsAccount.snapshot): a cycle only drills
+# into ranges/numbers whose count went up; every CRAWL_FULL_RESYNC_CYCLES cycles
+# everything is re-crawled. crawl_status['ok'] is True if any account crawled.
+crawl_status = {'ok': False}
+
+def _count_changed(previous, current, full_resync):
+    if full_resync or current is None or previous is None:
+        return True
+    # Any change, not just growth: recording a drop is what lets the next
+    # rise (even back to the old count) be seen as new messages
+    return current != previous
+
+async def _fetch_sms_ranges_async(account, client, limits):
+    async with limits['ranges']:
+        resp = await ivasms_request_async(account, client, 'POST', SMS_LIST_URL, build=lambda: _sms_ranges_request(account))
+    logger.info(f"[{account.name}] SMS ranges response: {resp.status_code}")
+    resp.raise_for_status()
+    ranges = parse_range_cards(resp.text)
+    logger.info(f"[{account.name}] Found ranges: {[name for name, _ in ranges]}")
+    return ranges
+
+async def _crawl_number(account, client, limits, emit, number, range_name, count):
+    """Emit each new OTP on `number` as soon as its SMS page is parsed. False on failure."""
     try:
-        if ivasms_session is None:
-            logger.error("No session available")
-            return []
+        async with limits['sms']:
+            resp = await ivasms_request_async(account, client, 'POST', SMS_DETAILS_URL, build=lambda: _sms_request(account, number, range_name))
+        resp.raise_for_status()
+        for sms_text in parse_sms_for_number(resp.text):
+            msg = build_otp_message(number, range_name, sms_text, account)
+            if msg:
+                emit(msg)
+        account.snapshot['numbers'].setdefault(range_name, {})[number] = count
+        return True
+    except Exception as e:
+        logger.error(f"[{account.name}] Error processing number {number}: {e}")
+        return False
 
-        refresh_session_if_needed()
+async def _crawl_range(account, client, limits, emit, range_name, count, full_resync):
+    snapshot = account.snapshot
+    try:
+        async with limits['numbers']:
+            resp = await ivasms_request_async(account, client, 'POST', SMS_NUMBERS_URL, build=lambda: _numbers_request(account, range_name))
+        resp.raise_for_status()
+        numbers = parse_number_cards(resp.text)
+        CYCLE_NUMBERS.labels(account.name).inc(len(numbers))
+        for number, _ in numbers:
+            number_accounts[number] = account
+
+        previous = snapshot['numbers'].get(range_name, {})
+        snapshot['numbers'][range_name] = {n: previous[n] for n, _ in numbers if n in previous}
+        changed = [(n, c) for n, c in numbers if _count_changed(previous.get(n), c, full_resync)]
+
+        results = await asyncio.gather(*(
+            _crawl_number(account, client, limits, emit, number, range_name, number_count)
+            for number, number_count in changed
+        ))
+        # Keep the old range count if any number failed so it is retried next cycle
+        if all(results):
+            snapshot['ranges'][range_name] = count
+    except Exception as e:
+        logger.error(f"[{account.name}] Error processing range {range_name}: {e}")
 
-        ranges = fetch_sms_ranges()
-        if not ranges:
-            # Try re-login once if no ranges
-            logger.warning("No ranges found, attempting re-login...")
-            if ivasms_login():
-                ranges = fetch_sms_ranges()
-            if not ranges:
-                return []
+async def _crawl_account(account, ranges_limit, emit):
+    """One account's crawl cycle, with its own HTTP client and per-account limits."""
+    snapshot = account.snapshot
+    snapshot['ok'] = False
+    try:
+        await asyncio.to_thread(refresh_session_if_needed, account)
 
-        for range_name in ranges:
-            try:
-                numbers = fetch_numbers_for_range(range_name)
-                country_name = extract_country_from_range(range_name)
-                country_emoji = get_country_emoji(country_name)
+        limits = {
+            'ranges': ranges_limit,
+            'numbers': asyncio.Semaphore(CRAWL_NUMBERS_CONCURRENCY),
+            'sms': asyncio.Semaphore(CRAWL_SMS_CONCURRENCY),
+        }
+        pool = httpx.Limits(max_connections=max(CRAWL_NUMBERS_CONCURRENCY, CRAWL_SMS_CONCURRENCY) + 1)
+
+        async with httpx.AsyncClient(cookies=account.session.cookies, limits=pool, timeout=30) as client:
+            # An expired session is caught and renewed inside ivasms_request_async,
+            # so an empty list here just means no SMS today
+            ranges = await _fetch_sms_ranges_async(account, client, limits)
+            CYCLE_RANGES.labels(account.name).set(len(ranges))
+            CYCLE_NUMBERS.labels(account.name).set(0)
+
+            cycle = snapshot['cycle']
+            full_resync = cycle % CRAWL_FULL_RESYNC_CYCLES == 0
+            snapshot['cycle'] = cycle + 1
+
+            previous = snapshot['ranges']
+            snapshot['ranges'] = {name: previous[name] for name, _ in ranges if name in previous}
+            snapshot['numbers'] = {name: snapshot['numbers'].get(name, {}) for name, _ in ranges}
+            changed = [(n, c) for n, c in ranges if _count_changed(previous.get(n), c, full_resync)]
+            logger.info(f"[{account.name}] Cycle {cycle}: {len(changed)}/{len(ranges)} ranges changed{' (full resync)' if full_resync else ''}")
+
+            await asyncio.gather(*(
+                _crawl_range(account, client, limits, emit, range_name, count, full_resync)
+                for range_name, count in changed
+            ))
+            snapshot['ok'] = True
 
-                for number in numbers:
-                    try:
-                        sms_list = fetch_sms_for_number(number, range_name)
-                        for sms_text in sms_list:
-                            otp = extract_otp(sms_text)
-                            if not otp:
-                                continue
-
-                            service = extract_service(sms_text)
-                            msg_id = f"{number}_{otp}_{sms_text[:30]}"
-
-                            if is_otp_already_sent(msg_id, sms_text):
-                                continue
-
-                            messages.append({
-                                'id': msg_id,
-                                'phone': number,
-                                'otp': otp,
-                                'service': service,
-                                'message': sms_text,
-                                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                'country': f"{country_emoji} {country_name}",
-                                'range': range_name,
-                            })
-
-                        time.sleep(0.3)
-
-                    except Exception as e:
-                        logger.error(f"Error processing number {number}: {e}")
-                        continue
+    except Exception as e:
+        logger.error(f"[{account.name}] Error in crawl: {e}")
+
+async def crawl_messages():
+    """Async iterator over one crawl cycle's new OTPs, yielded the moment each is parsed.
+
+    Every logged-in account is crawled concurrently; crawl_status['ok'] is
+    set once the cycle ends. Stopping early cancels the remaining crawl.
+    """
+    crawl_status['ok'] = False
+    live = [a for a in accounts if a.session is not None]
+    if not live:
+        logger.error("No session available")
+        return
 
-            except Exception as e:
-                logger.error(f"Error processing range {range_name}: {e}")
-                continue
+    found = asyncio.Queue()
+    seen = set()
+    finished = object()
+
+    def emit(msg):
+        # A number visible to two accounts yields the same OTP twice in one cycle;
+        # across cycles the shared history and delivery queue dedup it
+        if msg['id'] not in seen:
+            seen.add(msg['id'])
+            found.put_nowait(msg)
+
+    async def produce():
+        try:
+            # Range listing is the heaviest upstream call, so it is capped across all accounts
+            ranges_limit = asyncio.Semaphore(CRAWL_RANGES_CONCURRENCY)
+            await asyncio.gather(*(_crawl_account(account, ranges_limit, emit) for account in live))
+        finally:
+            found.put_nowait(finished)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (msg := await found.get()) is not finished:
+            yield msg
+        crawl_status['ok'] = any(account.snapshot['ok'] for account in live)
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
 
+async def get_received_sms_async():
+    messages = []
+    try:
+        async for msg in crawl_messages():
+            messages.append(msg)
     except Exception as e:
         logger.error(f"Error in get_received_sms: {e}")
-
     return messages
 
+def get_received_sms():
+    return asyncio.run(get_received_sms_async())
+
+# ============================================================
+# NUMBERS INVENTORY CACHE
+# ============================================================
+
+class NumbersInventory:
+    """Cached /portal/numbers rows with stale-while-revalidate.
+
+    Fresh for NUMBERS_CACHE_TTL seconds; after that readers still get the
+    old rows while one background thread fetches new ones. An empty fetch
+    is never fresh, so it is retried after NUMBERS_CACHE_RETRY_SECONDS.
+    """
+
+    def __init__(self, fetch, ttl):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.rows = None
+        self.fetched_at = 0
+        self.last_attempt = 0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.refreshing = False
+
+    def is_fresh(self):
+        return bool(self.rows) and time.time() - self.fetched_at < self.ttl
+
+    def refresh(self):
+        with self.refresh_lock:
+            # Someone else refreshed while we waited for the lock
+            if self.is_fresh():
+                return self.rows
+            self.last_attempt = time.time()
+            rows = self.fetch()
+            with self.lock:
+                if rows:
+                    self.rows = rows
+                    self.fetched_at = time.time()
+                    logger.info(f"📦 Numbers inventory refreshed: {len(rows)} rows")
+                else:
+                    if self.rows is None:
+                        self.rows = []
+                    logger.warning(f"Numbers inventory refresh returned nothing — retrying in {NUMBERS_CACHE_RETRY_SECONDS:g}s")
+            return self.rows
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing or time.time() - self.last_attempt < NUMBERS_CACHE_RETRY_SECONDS:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self.refreshing = False
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self):
+        """Rows from memory, never blocks; kicks a refresh when stale."""
+        if not self.is_fresh():
+            self.refresh_in_background()
+        return self.rows or []
+
+    async def get_async(self):
+        """Like get(), but waits (off the event loop) for the very first load."""
+        if self.rows is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.refresh) or []
+        return self.get()
+
+    def invalidate(self):
+        """Refetch on the next read, e.g. once a login has made the portal reachable again."""
+        with self.lock:
+            self.fetched_at = 0
+            self.last_attempt = 0
+
+
+numbers_inventory = NumbersInventory(get_all_ivasms_numbers, NUMBERS_CACHE_TTL)
+
+
+class NumberAllocator:
+    """Hands out numbers per range as exclusive, expiring leases.
+
+    Each range keeps its free numbers in least-recently-used order and its
+    leases in expiry order, so allocate/release/renew are O(1); expired
+    leases are reclaimed from the front when a range runs dry. The index is
+    rebuilt only when the inventory hands over new rows.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.rows = None
+        self.inventory = {}  # range_name -> {number: None} from the latest rows
+        self.free = {}    # range_name -> OrderedDict(number -> None), LRU first
+        self.leases = {}  # range_name -> OrderedDict(number -> (user_id, expires)), soonest expiry first
+        self.by_user = {}  # user_id -> (range_name, number)
+
+    def sync(self, rows):
+        """Rebuild the free lists from inventory rows; a no-op for rows already seen."""
+        with self.lock:
+            if rows is self.rows:
+                return
+            self.rows = rows
+            inventory = {}
+            for row in rows:
+                if len(row) >= 2:
+                    inventory.setdefault(row[1], {})[row[0]] = None
+            for range_name, numbers in inventory.items():
+                leased = self.leases.setdefault(range_name, OrderedDict())
+                # Keep the LRU order of numbers we already knew, new ones go last
+                old_free = self.free.get(range_name, OrderedDict())
+                free = OrderedDict((n, None) for n in old_free if n in numbers)
+                for number in numbers:
+                    if number not in leased and number not in free:
+                        free[number] = None
+                self.free[range_name] = free
+            for range_name in list(self.free):
+                if range_name not in inventory:
+                    del self.free[range_name]
+            self.inventory = inventory
+            self._update_gauges()
+
+    def _release(self, user_id):
+        range_name, number = self.by_user.pop(user_id, (None, None))
+        if number is not None and self.leases.get(range_name, {}).pop(number, None) is not None:
+            # Numbers that left the inventory while leased are not handed out again
+            if number in self.inventory.get(range_name, ()):
+                self.free[range_name][number] = None
+
+    def _reclaim_expired(self, range_name):
+        """Take back expired leases in `range_name`; returns the users who lost their number."""
+        now = time.time()
+        leased = self.leases.get(range_name, OrderedDict())
+        reclaimed = []
+        while leased:
+            number, (user_id, expires) = next(iter(leased.items()))
+            if expires > now:
+                break
+            self._release(user_id)
+            reclaimed.append(user_id)
+        return reclaimed
+
+    def allocate(self, user_id, range_name):
+        """Lease the least recently used free number in `range_name` to `user_id`, or None.
+
+        The user's previous number is released first, so calling this again
+        is "change number" and lands on a different number when one exists.
+        """
+        number, reclaimed = None, []
+        with self.lock:
+            self._release(user_id)
+            free = self.free.get(range_name)
+            if free is not None and not free:
+                reclaimed = self._reclaim_expired(range_name)
+            if free:
+                number, _ = free.popitem(last=False)
+                self.leases[range_name][number] = (user_id, time.time() + self.ttl)
+                self.by_user[user_id] = (range_name, number)
+            self._update_gauges()
+        # Outside the lock: the previous holders also lose their subscription and saved number
+        for previous_user in reclaimed:
+            release_assignment(previous_user)
+        return number
+
+    def release(self, user_id):
+        with self.lock:
+            self._release(user_id)
+            self._update_gauges()
+        release_assignment(user_id)
+
+    def renew(self, user_id):
+        with self.lock:
+            range_name, number = self.by_user.get(user_id, (None, None))
+            leased = self.leases.get(range_name)
+            if leased is not None and number in leased:
+                leased[number] = (user_id, time.time() + self.ttl)
+                leased.move_to_end(number)
+
+    def holding(self, user_id):
+        """(range_name, number) leased to `user_id`, or None."""
+        with self.lock:
+            return self.by_user.get(user_id)
+
+    def claim(self, user_id, range_name, number):
+        """Re-establish a lease restored from disk, ahead of the first inventory sync.
+
+        False if someone else already holds `number`.
+        """
+        with self.lock:
+            holder = self.leases.get(range_name, {}).get(number)
+            if holder is not None and holder[0] != user_id:
+                return False
+            self._release(user_id)
+            self.free.get(range_name, {}).pop(number, None)
+            self.leases.setdefault(range_name, OrderedDict())[number] = (user_id, time.time() + self.ttl)
+            self.by_user[user_id] = (range_name, number)
+            self._update_gauges()
+            return True
+
+    def free_count(self, range_name):
+        return len(self.free.get(range_name, ()))
+
+    def counts(self):
+        with self.lock:
+            return {
+                range_name: {'free': len(free), 'leased': len(self.leases.get(range_name, ()))}
+                for range_name, free in self.free.items()
+            }
+
+    def _update_gauges(self):
+        NUMBERS_FREE.set(sum(len(free) for free in self.free.values()))
+        NUMBERS_LEASED.set(len(self.by_user))
+
+
+number_allocator = NumberAllocator(NUMBER_LEASE_SECONDS)
+
+# ============================================================
+# USER SESSIONS — bounded, persistent per-user state
+# ============================================================
+
+class UserSession:
+    __slots__ = ('country', 'number', 'last_seen')
+
+    def __init__(self, country=None, number=None, last_seen=0.0):
+        self.country = country
+        self.number = number
+        self.last_seen = last_seen
+
+
+class UserSessionStore:
+    """Each user's chosen range and number, in least-recently-active order.
+
+    Sessions idle for USER_SESSION_TTL, or beyond USER_SESSIONS_MAX, are
+    evicted from the front along with their number lease and subscription.
+    Changes are checkpointed to USER_SESSIONS_FILE every
+    USER_SESSIONS_CHECKPOINT_SECONDS and on exit.
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.dirty = False
+
+    def _evict(self, now):
+        evicted = []
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_entries and now - session.last_seen < self.ttl:
+                break
+            del self.sessions[user_id]
+            evicted.append(user_id)
+        if evicted:
+            self.dirty = True
+        return evicted
+
+    def _release(self, evicted):
+        for user_id in evicted:
+            number_allocator.release(user_id)
+
+    def touch(self, user_id):
+        """Mark `user_id` active now, creating their session if needed."""
+        now = time.time()
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None:
+                session = self.sessions[user_id] = UserSession()
+            session.last_seen = now
+            self.sessions.move_to_end(user_id)
+            self.dirty = True
+            evicted = self._evict(now)
+        self._release(evicted)
+        return session
+
+    def update(self, user_id, **fields):
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None:
+                session = self.sessions[user_id] = UserSession(last_seen=time.time())
+            for name, value in fields.items():
+                setattr(session, name, value)
+            self.dirty = True
+
+    def clear_number(self, user_id):
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is not None and session.number is not None:
+                session.number = None
+                self.dirty = True
+
+    def get(self, user_id):
+        with self.lock:
+            return self.sessions.get(user_id)
+
+    def __len__(self):
+        """Live sessions only; idle ones are evicted first."""
+        with self.lock:
+            evicted = self._evict(time.time())
+            count = len(self.sessions)
+        self._release(evicted)
+        return count
+
+    def load(self):
+        """Restore checkpointed sessions and re-establish their number leases and subscriptions."""
+        try:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading user sessions: {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for user_id, (country, number, last_seen) in sorted(saved.items(), key=lambda item: item[1][2]):
+                self.sessions[int(user_id)] = UserSession(country, number, last_seen)
+            self._evict(now)
+            restored = [(user_id, s.country, s.number) for user_id, s in self.sessions.items() if s.number]
+        for user_id, country, number in restored:
+            if number_allocator.claim(user_id, country, number):
+                assign_number(user_id, number, country)
+            else:
+                logger.warning(f"Saved number {number} of user {user_id} is held by someone else — dropping it")
+                self.clear_number(user_id)
+        logger.info(f"👥 Restored {len(self.sessions)} user session(s), {len(restored)} with a number")
+
+    def checkpoint(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {str(u): [s.country, s.number, s.last_seen] for u, s in self.sessions.items()}
+            self.dirty = False
+        try:
+            atomic_write(self.path, json.dumps(snapshot, separators=(',', ':')))
+        except Exception as e:
+            logger.error(f"Error saving user sessions: {e}")
+            self.dirty = True
+
+    def hand_over(self):
+        """Checkpoint for the next leader, then forget every session and its number locally."""
+        self.checkpoint()
+        with self.lock:
+            users = list(self.sessions)
+            self.sessions.clear()
+            self.dirty = False
+        for user_id in users:
+            number_allocator.release(user_id)
+
+    def start(self):
+        def run_checkpointer():
+            while True:
+                time.sleep(USER_SESSIONS_CHECKPOINT_SECONDS)
+                self.checkpoint()
+        threading.Thread(target=run_checkpointer, daemon=True).start()
+        atexit.register(self.checkpoint)
+
+
+user_sessions = UserSessionStore(USER_SESSIONS_FILE, USER_SESSIONS_MAX, USER_SESSION_TTL)
+
+def allocate_user_number(user_id, range_name):
+    """Lease a number in `range_name` to `user_id` and wire it up everywhere. None if the range is full."""
+    number = number_allocator.allocate(user_id, range_name)
+    if number:
+        assign_number(user_id, number, range_name)
+    else:
+        release_assignment(user_id)
+    user_sessions.update(user_id, country=range_name, number=number)
+    return number
+
+def release_assignment(user_id):
+    """The one path for a user losing their number: no hot polling, direct OTPs or saved number."""
+    assign_number(user_id, None, None)
+    user_sessions.clear_number(user_id)
+
 # ============================================================
 # KEYBOARDS
 # ============================================================
@@ -699,8 +2524,7 @@ def main_menu_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def country_keyboard():
-    numbers = get_ivasms_numbers()
+def country_keyboard(numbers):
     ranges = {}
     for row in numbers:
         if len(row) >= 2:
@@ -712,10 +2536,9 @@ def country_keyboard():
     keyboard = []
     row = []
     for range_name, number in list(ranges.items())[:20]:
-        country = extract_country_from_range(range_name)
-        emoji = get_country_emoji(country)
+        emoji = get_range_emoji(range_name, number)
         row.append(InlineKeyboardButton(
-            f"{emoji} {range_name}",
+            f"{emoji} {range_name} ({number_allocator.free_count(range_name)} free)",
             callback_data=f"country_{range_name}"
         ))
         if len(row) == 2:
@@ -757,7 +2580,8 @@ def format_otp_message(data):
     phone = data.get('phone', 'Unknown')
     otp = data.get('otp', '------')
     timestamp = data.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    message = data.get('message', '')
+    # SMS text is untrusted — '<#>' and friends would break Telegram's HTML parser
+    message = escape(data.get('message', ''))
 
     if len(phone) > 6:
         masked = phone[:4] + '***' + phone[-4:]
@@ -793,36 +2617,34 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     data = query.data
     user_id = query.from_user.id
+    user_sessions.touch(user_id)
+    number_allocator.renew(user_id)
+    hot_set.touch(user_id)
 
     if data == "menu":
         await query.edit_message_text("🏠 <b>Main Menu</b>\n\nChoose an option:", parse_mode='HTML', reply_markup=main_menu_keyboard())
 
     elif data in ("get_number", "change_country"):
-        await query.edit_message_text("🌍 <b>Select Country:</b>\n\nLoading your IVASMS numbers...", parse_mode='HTML', reply_markup=country_keyboard())
+        numbers = await numbers_inventory.get_async()
+        number_allocator.sync(numbers)
+        await query.edit_message_text("🌍 <b>Select Country:</b>\n\nLoading your IVASMS numbers...", parse_mode='HTML', reply_markup=country_keyboard(numbers))
 
     elif data.startswith("country_"):
         range_name = data.replace("country_", "")
-        user_sessions[user_id] = {'country': range_name, 'number': None}
-        numbers = get_ivasms_numbers()
-        assigned_number = next((row[0] for row in numbers if len(row) >= 2 and row[1] == range_name), "No number available")
-        user_sessions[user_id]['number'] = assigned_number
-        country = extract_country_from_range(range_name)
-        emoji = get_country_emoji(country)
+        number_allocator.sync(await numbers_inventory.get_async())
+        assigned_number = allocate_user_number(user_id, range_name) or "No number available"
+        emoji = get_range_emoji(range_name, assigned_number)
         await query.edit_message_text(
             f"🔄 <b>Number Assigned Successfully</b>\n\n━━━━━━━━━━━━━━━━━━━━\n{emoji} <b>Range:</b> {range_name}\n📱 <b>Number:</b> <code>{assigned_number}</code>\n🟢 <b>Ready to receive OTP</b>\n━━━━━━━━━━━━━━━━━━━━\n\nUse this number to receive OTPs!",
             parse_mode='HTML', reply_markup=number_assigned_keyboard()
         )
 
     elif data == "change_number":
-        session_data = user_sessions.get(user_id, {})
-        range_name = session_data.get('country', 'Unknown')
-        current_number = session_data.get('number')
-        numbers = get_ivasms_numbers()
-        assigned_number = next((row[0] for row in numbers if len(row) >= 2 and row[1] == range_name and row[0] != current_number), "No other number available")
-        if user_id in user_sessions:
-            user_sessions[user_id]['number'] = assigned_number
-        country = extract_country_from_range(range_name)
-        emoji = get_country_emoji(country)
+        session = user_sessions.get(user_id)
+        range_name = session.country if session and session.country else 'Unknown'
+        number_allocator.sync(await numbers_inventory.get_async())
+        assigned_number = allocate_user_number(user_id, range_name) or "No other number available"
+        emoji = get_range_emoji(range_name, assigned_number)
         await query.edit_message_text(
             f"🔄 <b>New Number Assigned!</b>\n\n━━━━━━━━━━━━━━━━━━━━\n{emoji} <b>Range:</b> {range_name}\n📱 <b>Number:</b> <code>{assigned_number}</code>\n🟢 <b>Ready to receive OTP</b>\n━━━━━━━━━━━━━━━━━━━━",
             parse_mode='HTML', reply_markup=number_assigned_keyboard()
@@ -830,26 +2652,25 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data == "check":
         await query.edit_message_text("🔍 <b>Checking for new OTPs...</b>", parse_mode='HTML')
-        messages = get_received_sms()
+        # Runs on a worker thread; taps that arrive mid-crawl join the same run
+        messages = await upstream_flights.run_async('check', check_and_forward)
         if messages:
-            await query.edit_message_text(f"✅ <b>Found {len(messages)} new OTP(s)! Forwarding now...</b>", parse_mode='HTML', reply_markup=main_menu_keyboard())
-            for msg in messages:
-                await send_otp_to_group_async(msg)
+            await query.edit_message_text(f"✅ <b>Found {len(messages)} new OTP(s)!</b>\n\n{describe_otp_recipients()}", parse_mode='HTML', reply_markup=main_menu_keyboard())
         else:
-            await query.edit_message_text("📭 <b>No new OTPs found.</b>\n\nI check automatically every 10 seconds.", parse_mode='HTML', reply_markup=main_menu_keyboard())
+            await query.edit_message_text(f"📭 <b>No new OTPs found.</b>\n\nI check automatically every {poll_scheduler.describe()}.", parse_mode='HTML', reply_markup=main_menu_keyboard())
 
     elif data == "status":
         uptime = str(datetime.now() - bot_stats['start_time']).split('.')[0]
-        session_status = "🟢 Valid" if bot_stats['session_valid'] else "🔴 Expired"
+        session_status = ', '.join(f"{a.name} {'🟢' if a.session_valid else '🔴'}" for a in accounts) if len(accounts) > 1 else ("🟢 Valid" if bot_stats['session_valid'] else "🔴 Expired")
         await query.edit_message_text(
-            f"📊 <b>NEXUSBOT Status</b>\n\n⏱ <b>Uptime:</b> {uptime}\n📨 <b>OTPs Sent:</b> {bot_stats['total_otps_sent']}\n🕐 <b>Last Check:</b> {bot_stats['last_check']}\n🔐 <b>Session:</b> {session_status}\n🟢 <b>Monitor:</b> {'Running' if bot_stats['is_running'] else 'Stopped'}\n❌ <b>Last Error:</b> {bot_stats['last_error'] or 'None'}",
+            f"📊 <b>NEXUSBOT Status</b>\n\n⏱ <b>Uptime:</b> {uptime}\n📨 <b>OTPs Sent:</b> {bot_stats['total_otps_sent']}\n🕐 <b>Last Check:</b> {bot_stats['last_check']}\n🔐 <b>Session:</b> {session_status}\n🔁 <b>Poll Interval:</b> {poll_scheduler.describe()}\n🟢 <b>Monitor:</b> {('Running' if poller_lease.holds() else 'Standby') if bot_stats['is_running'] else 'Stopped'}\n❌ <b>Last Error:</b> {bot_stats['last_error'] or 'None'}",
             parse_mode='HTML', reply_markup=main_menu_keyboard()
         )
 
     elif data == "stats":
         uptime = str(datetime.now() - bot_stats['start_time']).split('.')[0]
         await query.edit_message_text(
-            f"📈 <b>Detailed Statistics</b>\n\n⏱ <b>Started:</b> {bot_stats['start_time'].strftime('%Y-%m-%d %H:%M:%S')}\n⏱ <b>Uptime:</b> {uptime}\n📨 <b>Total OTPs Sent:</b> {bot_stats['total_otps_sent']}\n🕐 <b>Last Check:</b> {bot_stats['last_check']}\n🔁 <b>Check Interval:</b> Every 10 seconds\n👥 <b>Active Users:</b> {len(user_sessions)}\n🟢 <b>Monitor Running:</b> {'Yes' if bot_stats['is_running'] else 'No'}",
+            f"📈 <b>Detailed Statistics</b>\n\n⏱ <b>Started:</b> {bot_stats['start_time'].strftime('%Y-%m-%d %H:%M:%S')}\n⏱ <b>Uptime:</b> {uptime}\n📨 <b>Total OTPs Sent:</b> {bot_stats['total_otps_sent']}\n🕐 <b>Last Check:</b> {bot_stats['last_check']}\n🔁 <b>Check Interval:</b> Every {poll_scheduler.describe()}\n👥 <b>Active Users:</b> {len(user_sessions)}\n🟢 <b>Monitor Running:</b> {'Yes' if bot_stats['is_running'] else 'No'}",
             parse_mode='HTML', reply_markup=main_menu_keyboard()
         )
 
@@ -863,50 +2684,514 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("✅ <b>Test OTP sent to the group!</b>", parse_mode='HTML', reply_markup=main_menu_keyboard())
 
 # ============================================================
-# SEND OTP TO GROUP
+# SEND OTP TO GROUP — persistent, rate-limited delivery queue
 # ============================================================
 
-async def send_otp_to_group_async(data):
-    try:
-        await bot.send_message(chat_id=GROUP_ID, text=format_otp_message(data), parse_mode='HTML', reply_markup=otp_buttons())
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`. Lives on the delivery loop only."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _chat_bucket(chat_id):
+    # Telegram: ~20 messages/minute into a group, ~1/second into a private chat
+    if str(chat_id).startswith('-'):
+        return TokenBucket(TELEGRAM_GROUP_PER_MINUTE / 60, TELEGRAM_GROUP_PER_MINUTE)
+    return TokenBucket(TELEGRAM_PRIVATE_PER_SECOND, 1)
+
+
+class DeliveryQueue:
+    """One long-lived sender for every OTP.
+
+    Jobs are persisted until every target chat has the message, so a crash
+    or restart doesn't lose them. Each process keeps its own file next to
+    DELIVERY_QUEUE_FILE, guarded by a `queue:<file>` lease; files whose owner
+    stopped renewing are adopted by a live instance, so a restored job is
+    only ever sent by the process holding it. The OTP is marked sent only
+    after delivery. Sends respect a global and a per-chat token bucket and
+    honour RetryAfter; other transient errors back off exponentially.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        root, ext = os.path.splitext(base_path)
+        self.path = f"{root}.{re.sub(r'[^A-Za-z0-9_.-]', '-', INSTANCE_ID)}{ext}"
+        self.lease = LeaderLease(self._lease_name(self.path), LEADER_LEASE_SECONDS)
+        self.lock = threading.Lock()
+        self.jobs = self._load()
+        self.loop = None
+        self.queue = None
+        self.in_flight = set()
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_PER_SECOND, TELEGRAM_GLOBAL_PER_SECOND)
+        self.chat_buckets = {}
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    jobs = json.load(f)
+                if jobs:
+                    logger.info(f"📬 Restored {len(jobs)} undelivered OTP(s)")
+                return jobs
+        except Exception as e:
+            logger.error(f"Error loading delivery queue: {e}")
+        return {}
+
+    @staticmethod
+    def _lease_name(path):
+        return f"queue:{os.path.basename(path)}"
+
+    def _adopt_orphans(self):
+        """Take over queue files left by instances that stopped renewing their lease."""
+        root, ext = os.path.splitext(self.base_path)
+        adopted = []
+        for path in [self.base_path] + glob.glob(f"{glob.escape(root)}.*{ext}"):
+            if path == self.path or not os.path.exists(path):
+                continue
+            name = self._lease_name(path)
+            try:
+                if not get_coordinator().acquire_lease(name, INSTANCE_ID, LEADER_LEASE_SECONDS):
+                    continue
+            except Exception as e:
+                logger.error(f"Could not lock delivery queue {path}: {e}")
+                continue
+            try:
+                with open(path, 'r') as f:
+                    jobs = json.load(f)
+                with self.lock:
+                    for key, job in jobs.items():
+                        if key not in self.jobs:
+                            self.jobs[key] = job
+                            adopted.append(key)
+                    self._save()
+                os.remove(path)
+                if jobs:
+                    logger.info(f"📬 Adopted {len(jobs)} undelivered OTP(s) from {path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error adopting delivery queue {path}: {e}")
+            finally:
+                get_coordinator().release_lease(name, INSTANCE_ID)
+        return adopted
+
+    async def _adopt_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                for key in await loop.run_in_executor(None, self._adopt_orphans):
+                    self.queue.put_nowait(key)
+            except Exception as e:
+                logger.error(f"Delivery queue adoption error: {e}")
+            await asyncio.sleep(LEADER_LEASE_SECONDS)
+
+    def _save(self):
+        try:
+            atomic_write(self.path, json.dumps(self.jobs, separators=(',', ':')))
+        except Exception as e:
+            logger.error(f"Error saving delivery queue: {e}")
+
+    def __len__(self):
+        return len(self.jobs)
+
+    @staticmethod
+    def job_key(msg_id, message):
+        return f"{msg_id}\n{message}"
+
+    def pending(self, msg_id, message):
+        return self.job_key(msg_id, message) in self.jobs
+
+    def enqueue(self, data, chat_ids=None):
+        """Queue an OTP for delivery. Safe to call from any thread; duplicates are ignored."""
+        key = self.job_key(data['id'], data['message'])
+        with self.lock:
+            if key in self.jobs:
+                return False
+            if not claim_otp(data['id'], data['message']):
+                # Another process sends this one; remember it so we stop finding it
+                logger.info(f"🤝 {data['id']} already claimed by another instance")
+                mark_otp_sent(data['id'], data.get('otp'), data['message'])
+                return False
+            self.jobs[key] = {'data': data, 'chat_ids': [GROUP_ID] if chat_ids is None else list(chat_ids), 'attempts': 0}
+            self._save()
+            # Before start() publishes the loop, the job is picked up from self.jobs instead
+            loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.queue.put_nowait, key)
+        return True
+
+    def start(self):
+        self.lease.start()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            queue = asyncio.Queue()
+            # Restored jobs and the loop go live together, so enqueue() never queues a key twice
+            with self.lock:
+                for key in self.jobs:
+                    queue.put_nowait(key)
+                self.queue = queue
+                self.loop = loop
+            loop.run_until_complete(self._run())
+        threading.Thread(target=run, daemon=True).start()
+        logger.info("✅ Delivery worker started")
+
+    async def _run(self):
+        request = HTTPXRequest(connection_pool_size=DELIVERY_WORKERS + 2)
+        async with Bot(token=BOT_TOKEN, request=request) as sender:
+            await asyncio.gather(self._adopt_periodically(), *(self._worker(sender) for _ in range(DELIVERY_WORKERS)))
+
+    async def _worker(self, sender):
+        while True:
+            key = await self.queue.get()
+            try:
+                await self._deliver(sender, key)
+            except Exception as e:
+                logger.error(f"Delivery worker error: {e}")
+                self._retry_later(key)
+
+    def _retry_later(self, key, delay=None):
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return
+            job['attempts'] += 1
+            if delay is None:
+                delay = min(DELIVERY_MAX_BACKOFF, 2 ** job['attempts']) + random.uniform(0, 1)
+            self._save()
+        self.loop.call_later(delay, self.queue.put_nowait, key)
+
+    async def _deliver(self, sender, key):
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None or key in self.in_flight:
+                return
+            self.in_flight.add(key)
+        try:
+            await self._send_job(sender, key, job)
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+
+    async def _send_job(self, sender, key, job):
+        data = job['data']
+
+        for chat_id in list(job['chat_ids']):
+            bucket = self.chat_buckets.setdefault(chat_id, _chat_bucket(chat_id))
+            await asyncio.sleep(bucket.reserve())
+            await asyncio.sleep(self.global_bucket.reserve())
+            chat_type = 'group' if str(chat_id).startswith('-') else 'private'
+            try:
+                with TELEGRAM_SEND_SECONDS.labels(chat_type).time():
+                    await sender.send_message(chat_id=chat_id, text=format_otp_message(data), parse_mode='HTML', reply_markup=otp_buttons())
+            except RetryAfter as e:
+                logger.warning(f"⏳ Telegram flood limit for {chat_id} — retrying in {e.retry_after}s")
+                bucket.pause(e.retry_after)
+                self._retry_later(key, delay=e.retry_after)
+                return
+            except (BadRequest, Forbidden) as e:
+                logger.error(f"❌ Telegram rejected OTP {data['otp']} for {chat_id}: {e} — not retrying this chat")
+            except TelegramError as e:
+                logger.warning(f"Failed to send OTP {data['otp']} (attempt {job['attempts'] + 1}): {e}")
+                self._retry_later(key)
+                return
+            else:
+                logger.info(f"✅ OTP sent: {data['otp']} | {data['service']} | {data['country']} → {chat_id}")
+                if data.get('discovered_at'):
+                    DISCOVERY_TO_DELIVERY_SECONDS.labels(chat_type).observe(time.time() - data['discovered_at'])
+            with self.lock:
+                job['chat_ids'].remove(chat_id)
+                self._save()
+
         mark_otp_sent(data['id'], data['otp'], data['message'])
         bot_stats['total_otps_sent'] += 1
-        logger.info(f"✅ OTP sent: {data['otp']} | {data['service']} | {data['country']}")
-    except Exception as e:
-        logger.error(f"Failed to send OTP: {e}")
-
-def send_otp_to_group(data):
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(send_otp_to_group_async(data))
-        loop.close()
-    except Exception as e:
-        logger.error(f"Error sending OTP: {e}")
+        OTPS_SENT.inc()
+        with self.lock:
+            self.jobs.pop(key, None)
+            self._save()
+
+
+delivery_queue = DeliveryQueue(DELIVERY_QUEUE_FILE)
+DELIVERY_QUEUE_DEPTH.set_function(lambda: len(delivery_queue))
+DEDUP_INDEX_SIZE.set_function(lambda: len(otp_history) if otp_history is not None else 0)
+
+class SubscriberIndex:
+    """phone -> chat ids of the users currently holding that number.
+
+    Kept in step with the number buttons, so routing an OTP is one dict
+    lookup. Subscriptions lapse after SUBSCRIPTION_IDLE_SECONDS (0 = never)
+    and are pruned lazily when their phone is looked up.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_phone = {}  # phone -> {user_id: (chat_id, expires)}
+        self.by_user = {}   # user_id -> phone
+
+    def _drop(self, user_id):
+        phone = self.by_user.pop(user_id, None)
+        subscribers = self.by_phone.get(phone)
+        if subscribers is not None:
+            subscribers.pop(user_id, None)
+            if not subscribers:
+                del self.by_phone[phone]
+
+    def assign(self, user_id, phone, chat_id=None):
+        expires = time.time() + SUBSCRIPTION_IDLE_SECONDS if SUBSCRIPTION_IDLE_SECONDS > 0 else float('inf')
+        with self.lock:
+            self._drop(user_id)
+            self.by_user[user_id] = phone
+            self.by_phone.setdefault(phone, {})[user_id] = (chat_id or user_id, expires)
+
+    def unassign(self, user_id):
+        with self.lock:
+            self._drop(user_id)
+
+    def lookup(self, phone):
+        now = time.time()
+        with self.lock:
+            subscribers = self.by_phone.get(phone, {})
+            for user_id in [u for u, (_, expires) in subscribers.items() if expires <= now]:
+                self._drop(user_id)
+            return [chat_id for chat_id, _ in subscribers.values()]
+
+    def __len__(self):
+        return len(self.by_user)
+
+
+subscriber_index = SubscriberIndex()
+
+def assign_number(user_id, number, range_name):
+    """Record (or with number=None, clear) a user's number for hot polling and direct delivery."""
+    if number:
+        hot_set.assign(user_id, number, range_name)
+        subscriber_index.assign(user_id, number)
+    else:
+        hot_set.unassign(user_id)
+        subscriber_index.unassign(user_id)
+
+def otp_recipients(phone):
+    subscribers = subscriber_index.lookup(phone)
+    if OTP_GROUP_BROADCAST == 'always' or (OTP_GROUP_BROADCAST == 'unassigned' and not subscribers):
+        return [GROUP_ID] + [chat_id for chat_id in subscribers if str(chat_id) != str(GROUP_ID)]
+    return subscribers
+
+def describe_otp_recipients():
+    """Where found OTPs went, per OTP_GROUP_BROADCAST, for replies to users."""
+    if OTP_GROUP_BROADCAST == 'always':
+        return "Sent to the group and to whoever holds each number."
+    if OTP_GROUP_BROADCAST == 'unassigned':
+        return "Sent to whoever holds each number, or to the group if nobody does."
+    return "Sent to whoever holds each number."
+
+def deliver_otp(data):
+    """Queue an OTP for its subscribers and, per OTP_GROUP_BROADCAST, the group.
+
+    False if it was already queued or claimed elsewhere, so callers only count new OTPs.
+    """
+    chat_ids = otp_recipients(data['phone'])
+    if not chat_ids:
+        # Nobody to tell; remember it so later cycles don't find it again
+        mark_otp_sent(data['id'], data['otp'], data['message'])
+    elif not delivery_queue.enqueue(data, chat_ids):
+        return False
+    hot_set.mark_recent(data['phone'], data['range'])
+    return True
 
 # ============================================================
 # BACKGROUND MONITOR
 # ============================================================
 
+async def _check_and_forward_async():
+    started = time.time()
+    messages = []
+    with POLL_CYCLE_SECONDS.time():
+        try:
+            async for msg in crawl_messages():
+                if not deliver_otp(msg):
+                    continue
+                if not messages:
+                    TIME_TO_FIRST_OTP_SECONDS.observe(time.time() - started)
+                messages.append(msg)
+        except Exception as e:
+            logger.error(f"Error in crawl: {e}")
+    bot_stats['last_check'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return messages
+
+def check_and_forward():
+    """One streaming crawl; each new OTP is queued for delivery the moment it is found.
+
+    Callers go through upstream_flights so only one runs at a time.
+    """
+    return asyncio.run(_check_and_forward_async())
+
+class PollScheduler:
+    """Picks the sleep between monitor cycles.
+
+    Aims for about one OTP per poll using an EWMA of the arrival rate,
+    never polls faster than the last cycle took (times POLL_DURATION_FACTOR),
+    stays within [POLL_MIN_INTERVAL, POLL_MAX_INTERVAL], and backs off
+    exponentially up to POLL_BACKOFF_CEILING on consecutive failures.
+    """
+
+    def __init__(self):
+        self.rate = 0.0
+        self.failures = 0
+        self.interval = POLL_MIN_INTERVAL
+        self.last_cycle_start = None
+
+    def _jitter(self, interval):
+        return interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    def record_success(self, found, started, duration):
+        elapsed = started - self.last_cycle_start if self.last_cycle_start else None
+        self.last_cycle_start = started
+        if elapsed:
+            sample = found / elapsed
+            self.rate = POLL_RATE_ALPHA * sample + (1 - POLL_RATE_ALPHA) * self.rate
+        self.failures = 0
+
+        if found:
+            interval = POLL_MIN_INTERVAL
+        elif self.rate > 0:
+            interval = 1 / self.rate
+        else:
+            interval = POLL_MAX_INTERVAL
+        interval = max(interval, duration * POLL_DURATION_FACTOR)
+        self.interval = min(POLL_MAX_INTERVAL, max(POLL_MIN_INTERVAL, interval))
+        return self._jitter(self.interval)
+
+    def record_failure(self):
+        self.failures += 1
+        self.last_cycle_start = None
+        self.interval = min(POLL_BACKOFF_CEILING, POLL_MIN_INTERVAL * 2 ** self.failures)
+        return self._jitter(self.interval)
+
+    def describe(self):
+        return f"{self.interval:.1f}s"
+
+
+poll_scheduler = PollScheduler()
+
+class HotSet:
+    """Numbers where an OTP is expected soon, with the range each belongs to.
+
+    A user's assignment stays hot until HOT_ASSIGNMENT_IDLE_SECONDS pass
+    without them touching the bot; a number that just got an OTP stays hot
+    for HOT_RECENT_SMS_SECONDS. Assigned numbers win when the set is full.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.assignments = {}  # user_id -> (number, range_name, expires)
+        self.recent = {}       # number -> (range_name, expires)
+
+    def assign(self, user_id, number, range_name):
+        with self.lock:
+            self.assignments[user_id] = (number, range_name, time.time() + HOT_ASSIGNMENT_IDLE_SECONDS)
+
+    def unassign(self, user_id):
+        with self.lock:
+            self.assignments.pop(user_id, None)
+
+    def touch(self, user_id):
+        """Keep the user's number hot, re-adding it from their lease if it went idle meanwhile."""
+        held = number_allocator.holding(user_id)
+        if held is not None:
+            range_name, number = held
+            self.assign(user_id, number, range_name)
+
+    def mark_recent(self, number, range_name):
+        with self.lock:
+            self.recent[number] = (range_name, time.time() + HOT_RECENT_SMS_SECONDS)
+
+    def numbers(self):
+        """[(number, range_name)] to poll now; expired entries are dropped."""
+        now = time.time()
+        with self.lock:
+            self.assignments = {u: a for u, a in self.assignments.items() if a[2] > now}
+            self.recent = {n: r for n, r in self.recent.items() if r[1] > now}
+            hot = {number: range_name for number, range_name, _ in self.assignments.values()}
+            HOT_SET_SIZE.labels('assigned').set(len(hot))
+            HOT_SET_SIZE.labels('recent').set(len(self.recent))
+            for number, (range_name, _) in self.recent.items():
+                hot.setdefault(number, range_name)
+        return list(hot.items())[:HOT_SET_MAX]
+
+
+hot_set = HotSet()
+
+def poll_hot_number(number, range_name):
+    """fetch_sms_for_number() for one hot number, queueing any new OTP. Returns how many."""
+    found = 0
+    for sms_text in fetch_sms_for_number(number, range_name):
+        msg = build_otp_message(number, range_name, sms_text, number_accounts.get(number))
+        if msg and deliver_otp(msg):
+            found += 1
+    return found
+
+def hot_poller():
+    """Second, faster tier next to background_monitor's full sweep."""
+    logger.info(f"🔥 Hot-set poller started (every {HOT_POLL_INTERVAL:g}s)")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HOT_POLL_CONCURRENCY) as pool:
+        while True:
+            started = time.time()
+            hot = hot_set.numbers()
+            if hot and poller_lease.holds() and any(a.session is not None for a in accounts):
+                try:
+                    with HOT_POLL_SECONDS.time():
+                        found = sum(pool.map(lambda item: poll_hot_number(*item), hot))
+                    if found:
+                        logger.info(f"🔥 Hot set: {found} new OTP(s) from {len(hot)} number(s)")
+                except Exception as e:
+                    logger.error(f"Hot-set poll error: {e}")
+            time.sleep(max(0.0, HOT_POLL_INTERVAL - (time.time() - started)))
+
 def background_monitor():
     bot_stats['is_running'] = True
     logger.info("🔍 Background OTP monitor started")
 
     while bot_stats['is_running']:
+        if not poller_lease.holds():
+            # Another process polls; we keep serving the bot and HTTP side
+            time.sleep(min(POLL_MIN_INTERVAL, LEADER_LEASE_SECONDS / 3))
+            continue
         try:
             logger.info("Checking for new OTPs...")
-            messages = get_received_sms()
-            bot_stats['last_check'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            started = time.time()
+            messages = upstream_flights.run('check', check_and_forward)
+            duration = time.time() - started
 
             if messages:
                 logger.info(f"Found {len(messages)} new OTPs")
-                for msg in messages:
-                    send_otp_to_group(msg)
                 bot_stats['consecutive_failures'] = 0
             else:
                 logger.info("No new OTPs found")
 
-            time.sleep(10)
+            if crawl_status['ok']:
+                delay = poll_scheduler.record_success(len(messages), started, duration)
+            else:
+                delay = poll_scheduler.record_failure()
+            logger.info(f"Cycle took {duration:.1f}s — next check in {delay:.1f}s")
+            time.sleep(delay)
 
         except Exception as e:
             logger.error(f"Monitor error: {e}")
@@ -914,23 +3199,115 @@ def background_monitor():
             bot_stats['consecutive_failures'] += 1
             if bot_stats['consecutive_failures'] >= 5:
                 logger.warning("5 consecutive failures — re-logging in...")
-                ivasms_login()
+                login_all()
                 bot_stats['consecutive_failures'] = 0
-            time.sleep(30)
+            time.sleep(poll_scheduler.record_failure())
 
 def start_telegram_bot():
+    """Serve Telegram updates only while this instance holds the poller lease."""
     if telegram_app:
+        async def supervise():
+            await telegram_app.initialize()
+            polling = False
+            while True:
+                try:
+                    if poller_lease.holds() and not polling:
+                        # Pick up the assignments the previous leader checkpointed
+                        await asyncio.to_thread(user_sessions.load)
+                        await telegram_app.start()
+                        await telegram_app.updater.start_polling(drop_pending_updates=True)
+                        polling = True
+                        logger.info("✅ Telegram bot polling started")
+                    elif polling and not poller_lease.holds():
+                        await telegram_app.updater.stop()
+                        await telegram_app.stop()
+                        polling = False
+                        await asyncio.to_thread(user_sessions.hand_over)
+                        logger.info("⏸ Telegram bot polling stopped — lost the poller lease")
+                except Exception as e:
+                    logger.error(f"Telegram supervisor error: {e}")
+                await asyncio.sleep(LEADER_LEASE_SECONDS / 3)
+
         def run_bot():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            async def start():
-                await telegram_app.initialize()
-                await telegram_app.start()
-                await telegram_app.updater.start_polling(drop_pending_updates=True)
-            loop.run_until_complete(start())
-            loop.run_forever()
+            loop.run_until_complete(supervise())
         threading.Thread(target=run_bot, daemon=True).start()
-        logger.info("✅ Telegram bot polling started")
+
+# ============================================================
+# JOBS — background work triggered over HTTP
+# ============================================================
+
+class JobRegistry:
+    """Tracks /check and /relogin runs so the request can return at once.
+
+    Jobs ride on upstream_flights: a trigger that lands while the same
+    flight is running (another /check, a button press or the monitor's
+    own cycle) gets that run's job instead of starting a new one.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.by_future = {}
+
+    def submit(self, kind, fn, *args, summarize=None):
+        """Returns (job, created)."""
+        future = upstream_flights.submit(kind, fn, *args)
+        with self.lock:
+            job_id = self.by_future.get(future)
+            if job_id is not None:
+                return self.jobs[job_id], False
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'kind': kind,
+                'status': 'running',
+                'created': time.time(),
+                'finished': None,
+                'result': None,
+                'error': None,
+            }
+            self.jobs[job['id']] = job
+            self.by_future[future] = job['id']
+            self._evict()
+        future.add_done_callback(lambda f: self._finish(job, f, summarize))
+        return job, True
+
+    def _finish(self, job, future, summarize):
+        error = future.exception()
+        with self.lock:
+            self.by_future.pop(future, None)
+            job['finished'] = time.time()
+            if error is not None:
+                job['status'], job['error'] = 'failed', str(error)
+            else:
+                job['status'] = 'done'
+                job['result'] = summarize(future.result()) if summarize else future.result()
+
+    def _evict(self):
+        # Oldest finished jobs go first; running ones are never dropped
+        for job_id in [j for j, job in self.jobs.items() if job['finished']]:
+            if len(self.jobs) <= self.limit:
+                break
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+
+jobs = JobRegistry(JOB_HISTORY_SIZE)
+
+def _job_view(job):
+    view = dict(job)
+    view['created'] = datetime.fromtimestamp(job['created']).strftime('%Y-%m-%d %H:%M:%S')
+    if job['finished']:
+        view['duration_seconds'] = round(job['finished'] - job['created'], 3)
+        view['finished'] = datetime.fromtimestamp(job['finished']).strftime('%Y-%m-%d %H:%M:%S')
+    view['url'] = f"/jobs/{job['id']}"
+    return view
 
 # ============================================================
 # FLASK ROUTES
@@ -948,12 +3325,19 @@ def home():
         'session_valid': bot_stats['session_valid'],
     })
 
-@app.route('/check')
+@app.route('/check', methods=['GET', 'POST'])
 def manual_check():
-    messages = get_received_sms()
-    for msg in messages:
-        send_otp_to_group(msg)
-    return jsonify({'status': 'success', 'found': len(messages)})
+    if not poller_lease.holds():
+        return jsonify({'error': 'standby instance', 'instance_id': INSTANCE_ID}), 409
+    job, created = jobs.submit('check', check_and_forward, summarize=lambda messages: {'found': len(messages)})
+    return jsonify({'status': 'queued' if created else 'joined', 'job': _job_view(job)}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(_job_view(job))
 
 @app.route('/status')
 def status():
@@ -964,13 +3348,31 @@ def status():
         'last_check': bot_stats['last_check'],
         'is_running': bot_stats['is_running'],
         'session_valid': bot_stats['session_valid'],
-        'last_error': bot_stats['last_error']
+        'accounts': {a.name: {'session_valid': a.session_valid, 'last_login': a.last_login_time} for a in accounts},
+        'last_error': bot_stats['last_error'],
+        'poll_interval_seconds': round(poll_scheduler.interval, 2),
+        'otp_rate_per_minute': round(poll_scheduler.rate * 60, 3),
+        'consecutive_poll_failures': poll_scheduler.failures,
+        'active_users': len(user_sessions),
+        'hot_numbers': len(hot_set.numbers()),
+        'numbers_by_range': number_allocator.counts(),
+        'instance_id': INSTANCE_ID,
+        'is_poller_leader': poller_lease.holds(),
     })
 
-@app.route('/relogin')
+@app.route('/metrics')
+def metrics():
+    if not HAS_PROMETHEUS:
+        return Response("prometheus_client not installed\n", status=501, mimetype='text/plain')
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
+@app.route('/relogin', methods=['GET', 'POST'])
 def relogin():
-    threading.Thread(target=ivasms_login, daemon=True).start()
-    return jsonify({'status': 'Relogin started'})
+    job, created = jobs.submit('relogin', login_all, summarize=lambda ok: {
+        'session_valid': ok,
+        'accounts': {a.name: a.session_valid for a in accounts},
+    })
+    return jsonify({'status': 'queued' if created else 'joined', 'job': _job_view(job)}), 202
 
 # ============================================================
 # MAIN
@@ -981,11 +3383,18 @@ def main():
 
     logger.info("🚀 Starting NEXUSBOT...")
 
-    if not all([BOT_TOKEN, GROUP_ID, IVASMS_EMAIL, IVASMS_PASSWORD]):
+    if not all([BOT_TOKEN, GROUP_ID]) or not accounts:
         logger.error("❌ Missing required env vars!")
         return
 
-    ivasms_login()
+    get_otp_history()
+    user_sessions.start()
+    poller_lease.start()
+    logger.info(f"👥 {len(accounts)} IVASMS account(s): {', '.join(a.name for a in accounts)}")
+    # Accounts are independent, so restore / log them in side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(accounts)) as pool:
+        list(pool.map(lambda a: restore_session(a) or coordinated_login(a), accounts))
+    numbers_inventory.refresh_in_background()
 
     bot = Bot(token=BOT_TOKEN)
     telegram_app = Application.builder().token(BOT_TOKEN).build()
@@ -994,17 +3403,21 @@ def main():
 
     logger.info("✅ Bot initialized")
     start_telegram_bot()
+    delivery_queue.start()
 
     def send_startup():
         time.sleep(3)
+        if not poller_lease.holds():
+            return
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             async def send():
-                session_line = "✅ Session valid" if bot_stats['session_valid'] else "⚠️ Login failed — check credentials"
+                valid = sum(a.session_valid for a in accounts)
+                session_line = f"✅ Session valid ({valid}/{len(accounts)} accounts)" if valid else "⚠️ Login failed — check credentials"
                 await bot.send_message(
                     chat_id=GROUP_ID,
-                    text=f"🚀 <b>NEXUSBOT Started!</b>\n\n{session_line}\n✅ Monitoring every 10 seconds\n✅ Ready to forward OTPs",
+                    text=f"🚀 <b>NEXUSBOT Started!</b>\n\n{session_line}\n✅ Adaptive polling every {POLL_MIN_INTERVAL:g}–{POLL_MAX_INTERVAL:g} seconds\n✅ Ready to forward OTPs",
                     parse_mode='HTML', reply_markup=otp_buttons()
                 )
             loop.run_until_complete(send())
@@ -1014,10 +3427,15 @@ def main():
 
     threading.Thread(target=send_startup, daemon=True).start()
     threading.Thread(target=background_monitor, daemon=True).start()
+    threading.Thread(target=hot_poller, daemon=True).start()
 
     port = int(os.environ.get('PORT', 5000))
-    logger.info(f"Starting Flask on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    if HAS_WAITRESS:
+        logger.info(f"Starting HTTP server (waitress, {HTTP_THREADS} threads) on port {port}")
+        waitress_serve(app, host='0.0.0.0', port=port, threads=HTTP_THREADS)
+    else:
+        logger.info(f"Starting Flask on port {port}")
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,109 @@
+"""Leases and claim-once across the local, SQLite and Redis coordinators.
+
+Each backend gets a factory, so two "processes" are two coordinators
+sharing the same store (the local one can only share itself).
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture(params=['local', 'sqlite', 'redis'])
+def connect(request, tmp_path, monkeypatch):
+    """Returns a function that opens another coordinator on the same store."""
+    if request.param == 'local':
+        shared = main.LocalCoordinator()
+        return lambda: shared
+    if request.param == 'sqlite':
+        path = str(tmp_path / 'coordination.db')
+        return lambda: main.SqliteCoordinator(path)
+    fakeredis = pytest.importorskip('fakeredis')
+    if not main.HAS_REDIS:
+        pytest.skip('redis not installed')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(main.redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return lambda: main.RedisCoordinator('redis://fake')
+
+
+def test_lease_is_exclusive_and_renewable(connect):
+    a, b = connect(), connect()
+    assert a.acquire_lease('poller', 'a', 30)
+    assert not b.acquire_lease('poller', 'b', 30)
+    assert a.acquire_lease('poller', 'a', 30)
+
+
+def test_lease_is_taken_over_after_expiry(connect):
+    a, b = connect(), connect()
+    assert a.acquire_lease('poller', 'a', 0.2)
+    time.sleep(0.3)
+    assert b.acquire_lease('poller', 'b', 30)
+    assert not a.acquire_lease('poller', 'a', 30)
+
+
+def test_release_only_by_holder(connect):
+    a, b = connect(), connect()
+    assert a.acquire_lease('poller', 'a', 30)
+    b.release_lease('poller', 'b')
+    assert not b.acquire_lease('poller', 'b', 30)
+    a.release_lease('poller', 'a')
+    assert b.acquire_lease('poller', 'b', 30)
+
+
+def test_claim_once_until_expiry(connect):
+    a, b = connect(), connect()
+    assert a.claim('otp-1', 'a', 1)
+    assert not b.claim('otp-1', 'b', 1)
+    assert not a.claim('otp-1', 'a', 1)
+    assert b.claim('otp-2', 'b', 1)
+    time.sleep(1.1)
+    assert b.claim('otp-1', 'b', 1)
+
+
+def test_concurrent_claims_have_one_winner(connect):
+    coordinators = [connect() for _ in range(8)]
+    results = []
+    barrier = threading.Barrier(len(coordinators))
+
+    def race(i):
+        barrier.wait()
+        results.append(coordinators[i].claim('otp-race', f'owner-{i}', 30))
+
+    threads = [threading.Thread(target=race, args=(i,)) for i in range(len(coordinators))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+
+
+def test_concurrent_lease_takeover_has_one_winner(connect):
+    coordinators = [connect() for _ in range(8)]
+    assert coordinators[0].acquire_lease('poller', 'stale', 0.2)
+    time.sleep(0.3)
+    results = []
+    barrier = threading.Barrier(len(coordinators))
+
+    def race(i):
+        barrier.wait()
+        results.append(coordinators[i].acquire_lease('poller', f'owner-{i}', 30))
+
+    threads = [threading.Thread(target=race, args=(i,)) for i in range(len(coordinators))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+
+
+def test_claim_otp_keys_on_the_full_message(monkeypatch):
+    monkeypatch.setattr(main, 'coordinator', main.LocalCoordinator())
+    assert main.claim_otp('123_4455_Your code', 'Your code 4455 for A')
+    assert main.claim_otp('123_4455_Your code', 'Your code 4455 for B')
+    assert not main.claim_otp('123_4455_Your code', 'Your code 4455 for A')
@@ -0,0 +1,48 @@
+"""Number leases: a reclaimed number must stop reaching its previous holder."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+ROWS = [['111', 'TEST RANGE']]
+
+
+@pytest.fixture
+def fresh_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'OTP_GROUP_BROADCAST', 'unassigned')
+    monkeypatch.setattr(main, 'number_allocator', main.NumberAllocator(ttl=60))
+    monkeypatch.setattr(main, 'subscriber_index', main.SubscriberIndex())
+    monkeypatch.setattr(main, 'hot_set', main.HotSet())
+    monkeypatch.setattr(main, 'user_sessions', main.UserSessionStore(str(tmp_path / 'user_sessions.json'), 100, 3600))
+    main.number_allocator.sync(ROWS)
+
+
+def expire_leases():
+    allocator = main.number_allocator
+    for leased in allocator.leases.values():
+        for number, (user_id, _) in list(leased.items()):
+            leased[number] = (user_id, 0)
+
+
+def test_reclaimed_number_goes_only_to_new_holder(fresh_state):
+    assert main.allocate_user_number(1, 'TEST RANGE') == '111'
+    assert main.otp_recipients('111') == [1]
+
+    expire_leases()
+    assert main.allocate_user_number(3, 'TEST RANGE') == '111'
+
+    assert main.otp_recipients('111') == [3]
+    assert main.user_sessions.get(1).number is None
+    assert main.user_sessions.get(3).number == '111'
+
+
+def test_restore_skips_number_held_by_someone_else(fresh_state):
+    main.allocate_user_number(3, 'TEST RANGE')
+    main.user_sessions.update(1, country='TEST RANGE', number='111')
+
+    assert not main.number_allocator.claim(1, 'TEST RANGE', '111')
+    assert main.number_allocator.claim(3, 'TEST RANGE', '111')